@@ -0,0 +1,306 @@
+"""
+Local stand-in for the parts of the Stripe API the app uses.
+
+Serves PaymentIntent create/retrieve/confirm, PaymentMethod retrieve and
+Refund create from memory, with configurable latency and injected
+failures, so checkout, reschedule payments and refunds can be load-tested
+without reaching Stripe. Point the app at it with STRIPE_API_BASE; run it
+with the `fake_stripe_server` management command.
+
+When a webhook URL and secret are given, confirming an intent and creating
+a refund also deliver signed payment_intent.succeeded, charge.succeeded
+and charge.refunded events, as Stripe would.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = '2025-05-28.basil'
+
+
+def _new_id(prefix):
+    return f"{prefix}_fake{uuid.uuid4().hex[:20]}"
+
+
+def _parse_form(body):
+    """
+    Decodes Stripe's form encoding, e.g. 'metadata[booking_id]=3', into
+    nested dicts.
+    """
+    params = {}
+    for name, value in parse_qsl(body, keep_blank_values=True):
+        keys = re.findall(r'[^\[\]]+', name)
+        target = params
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return params
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """
+    Returns a Stripe-Signature header value for the payload.
+    """
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def build_event(event_type, obj):
+    """
+    Returns the JSON payload of a webhook event wrapping obj.
+    """
+    return json.dumps({
+        'id': _new_id('evt'),
+        'object': 'event',
+        'api_version': API_VERSION,
+        'created': int(time.time()),
+        'type': event_type,
+        'data': {'object': obj},
+    })
+
+
+class FakeStripeState:
+    """
+    In-memory store of intents, charges and refunds, plus the responses
+    already given for each Idempotency-Key.
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0,
+                 webhook_url=None, webhook_secret=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.lock = threading.Lock()
+        self.payment_intents = {}
+        self.charges = {}
+        self.idempotent_responses = {}
+
+    def delay(self):
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def should_fail(self):
+        return self.failure_rate and random.random() < self.failure_rate
+
+    def create_payment_intent(self, params):
+        intent_id = _new_id('pi')
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': int(params.get('amount', 0)),
+            'currency': params.get('currency', 'php'),
+            'status': 'requires_payment_method',
+            'client_secret': f"{intent_id}_secret_{uuid.uuid4().hex[:12]}",
+            'metadata': params.get('metadata', {}),
+            'payment_method': None,
+            'latest_charge': None,
+            'created': int(time.time()),
+            'livemode': False,
+        }
+        with self.lock:
+            self.payment_intents[intent_id] = intent
+        return 200, intent
+
+    def retrieve_payment_intent(self, intent_id):
+        with self.lock:
+            intent = self.payment_intents.get(intent_id)
+        if intent is None:
+            return _not_found('payment_intent', intent_id)
+        return 200, intent
+
+    def confirm_payment_intent(self, intent_id, params):
+        with self.lock:
+            intent = self.payment_intents.get(intent_id)
+            if intent is None:
+                return _not_found('payment_intent', intent_id)
+            if intent['status'] != 'succeeded':
+                charge = {
+                    'id': _new_id('ch'),
+                    'object': 'charge',
+                    'amount': intent['amount'],
+                    'amount_refunded': 0,
+                    'refunded': False,
+                    'payment_intent': intent_id,
+                    'payment_method_details': {
+                        'type': 'card',
+                        'card': {'brand': 'visa', 'last4': '4242'},
+                    },
+                }
+                self.charges[charge['id']] = charge
+                intent.update({
+                    'status': 'succeeded',
+                    'payment_method':
+                        params.get('payment_method') or _new_id('pm'),
+                    'latest_charge': charge['id'],
+                })
+                self.send_webhook('payment_intent.succeeded', intent)
+                self.send_webhook('charge.succeeded', charge)
+        return 200, intent
+
+    def retrieve_payment_method(self, method_id):
+        return 200, {
+            'id': method_id,
+            'object': 'payment_method',
+            'type': 'card',
+            'card': {'brand': 'visa', 'last4': '4242'},
+        }
+
+    def create_refund(self, params):
+        with self.lock:
+            intent = self.payment_intents.get(params.get('payment_intent'))
+            if intent is None or not intent['latest_charge']:
+                return 400, {'error': {
+                    'type': 'invalid_request_error',
+                    'message': 'This PaymentIntent has no charge to refund.',
+                    'param': 'payment_intent',
+                }}
+            charge = self.charges[intent['latest_charge']]
+            amount = int(params.get('amount') or
+                         charge['amount'] - charge['amount_refunded'])
+            charge['amount_refunded'] += amount
+            charge['refunded'] = charge['amount_refunded'] >= charge['amount']
+            refund = {
+                'id': _new_id('re'),
+                'object': 'refund',
+                'amount': amount,
+                'charge': charge['id'],
+                'payment_intent': intent['id'],
+                'metadata': params.get('metadata', {}),
+                'status': 'succeeded',
+            }
+            self.send_webhook('charge.refunded', charge)
+        return 200, refund
+
+    def send_webhook(self, event_type, obj):
+        """
+        Delivers a signed event to the webhook URL in the background.
+        """
+        if not self.webhook_url or not self.webhook_secret:
+            return
+        payload = build_event(event_type, dict(obj))
+        request = urllib.request.Request(
+            self.webhook_url,
+            data=payload.encode(),
+            headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': sign_payload(
+                    payload, self.webhook_secret),
+            },
+        )
+
+        def deliver():
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+            except Exception as e:
+                logger.warning(
+                    "Fake Stripe could not deliver %s: %s", event_type, e)
+
+        threading.Thread(target=deliver, daemon=True).start()
+
+
+def _not_found(kind, object_id):
+    return 404, {'error': {
+        'type': 'invalid_request_error',
+        'code': 'resource_missing',
+        'message': f"No such {kind}: '{object_id}'",
+    }}
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeStripe/1.0'
+
+    ROUTES = [
+        ('POST', r'^/v1/payment_intents$', 'create_payment_intent'),
+        ('GET', r'^/v1/payment_intents/(?P<id>[^/]+)$',
+         'retrieve_payment_intent'),
+        ('POST', r'^/v1/payment_intents/(?P<id>[^/]+)/confirm$',
+         'confirm_payment_intent'),
+        ('GET', r'^/v1/payment_methods/(?P<id>[^/]+)$',
+         'retrieve_payment_method'),
+        ('POST', r'^/v1/refunds$', 'create_refund'),
+    ]
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        state = self.server.state
+        path = urlsplit(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        params = _parse_form(self.rfile.read(length).decode()) \
+            if length else {}
+
+        state.delay()
+        if state.should_fail():
+            return self._respond(500, {'error': {
+                'type': 'api_error',
+                'message': 'Injected failure from the fake Stripe server.',
+            }})
+
+        idempotency_key = self.headers.get('Idempotency-Key')
+        if method == 'POST' and idempotency_key:
+            with state.lock:
+                cached = state.idempotent_responses.get(idempotency_key)
+            if cached:
+                return self._respond(*cached)
+
+        for route_method, pattern, action in self.ROUTES:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                args = list(match.groupdict().values())
+                if method == 'POST':
+                    args.append(params)
+                status, body = getattr(state, action)(*args)
+                if method == 'POST' and idempotency_key and status < 500:
+                    with state.lock:
+                        state.idempotent_responses[idempotency_key] = (
+                            status, body)
+                return self._respond(status, body)
+
+        self._respond(*_not_found('route', path))
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Request-Id', _new_id('req'))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("Fake Stripe: " + format, *args)
+
+
+def make_server(host='127.0.0.1', port=12111, **options):
+    """
+    Returns a threaded fake Stripe server; options are passed to
+    FakeStripeState. Port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), FakeStripeHandler)
+    server.daemon_threads = True
+    server.state = FakeStripeState(**options)
+    return server
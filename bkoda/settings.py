@@ -5,6 +5,7 @@ Generated by 'django-admin startproject' using Django 5.2.1.
 
 """
 
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 import os
 import dj_database_url
@@ -123,6 +124,45 @@ else:
         }
     }
 
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    # LocMemCache is private to each process: a seat change in one worker
+    # would not invalidate the trip searches cached by the others, which
+    # would go on showing stale seat counts. Production needs Redis.
+    if not DEBUG and int(os.environ.get('WEB_CONCURRENCY') or 1) > 1:
+        raise ImproperlyConfigured(
+            "REDIS_URL must be set when running more than one worker: "
+            "the trip search and booking stats caches are invalidated "
+            "through a cache shared by all workers.")
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+TRIP_SEARCH_CACHE_TIMEOUT = 60
+BOOKING_STATS_CACHE_TIMEOUT = 30
+DAILY_BOOKING_STATS_REFRESH_DAYS = 7
+TRIP_SCHEDULE_HORIZON_DAYS = 14
+TRIP_SCHEDULE_MAX_HORIZON_DAYS = 366
+
+SEAT_HOLD_MINUTES = 15
+SEAT_HOLD_RELEASE_INTERVAL = 60
+
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60
+EMAIL_OUTBOX_LEASE_SECONDS = 300
+
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_WAIT_SECONDS = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME':
@@ -161,6 +201,19 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 STRIPE_CURRENCY = 'php'
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
+STRIPE_WH_SECRET = os.getenv('STRIPE_WH_SECRET', '')
+# Base URL of a Stripe stand-in, e.g. http://127.0.0.1:12111 for the
+# fake_stripe_server command. Empty means the real Stripe API.
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+STRIPE_CONNECT_TIMEOUT = 3
+STRIPE_READ_TIMEOUT = 10
+STRIPE_MAX_NETWORK_RETRIES = 1
+STRIPE_HTTP_POOL_SIZE = 10
+STRIPE_BREAKER_FAILURE_THRESHOLD = 5
+STRIPE_BREAKER_RESET_SECONDS = 30
+STRIPE_WEBHOOK_GRACE_SECONDS = 30
+PAYMENT_SYNC_INTERVAL = 10
+PAYMENT_INTENT_CACHE_TIMEOUT = 300
 
 STRIPE_MOCK_REFUNDS = True
 
@@ -0,0 +1,262 @@
+"""
+Shared Stripe gateway.
+
+Every Stripe API call goes through one StripeClient per process. The
+client keeps a pooled HTTP session, has strict connect/read timeouts and a
+bounded number of retries, and sits behind a circuit breaker. After
+STRIPE_BREAKER_FAILURE_THRESHOLD consecutive outages (connection errors,
+rate limiting or 5xx responses) calls fail fast with StripeUnavailable,
+without touching the network, for STRIPE_BREAKER_RESET_SECONDS. After that
+one trial call is let through to probe whether Stripe has recovered.
+
+Errors raised here are all stripe.error.StripeError subclasses, so
+existing `except stripe.error.StripeError` handlers keep working.
+"""
+from django.conf import settings
+from django.dispatch import Signal
+
+import logging
+import threading
+import time
+
+import requests
+import stripe
+
+logger = logging.getLogger(__name__)
+
+# Sent after every Stripe call with `operation` (e.g.
+# 'payment_intents.create'), `duration` (seconds) and `error` (the raised
+# exception or None).
+stripe_call = Signal()
+
+_OUTAGE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+
+class StripeUnavailable(stripe.error.APIConnectionError):
+    """
+    Raised instead of calling Stripe while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive outages and opens after `failure_threshold` of them.
+    While open, allow() returns False until `reset_timeout` seconds have
+    passed; then it lets a single trial call through (half-open), whose
+    result closes or re-opens the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or \
+                    self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(
+                        "Stripe circuit breaker opened after %s failures.",
+                        self._failures)
+                self._opened_at = time.monotonic()
+
+
+_client_lock = threading.Lock()
+_client = None
+_breaker = None
+
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+
+def _build_client():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    http_client = stripe.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT,
+                 settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+    # STRIPE_API_BASE points the client at a local stand-in such as the
+    # fake_stripe_server command, which accepts any key.
+    base_addresses = {}
+    api_key = settings.STRIPE_SECRET_KEY
+    if settings.STRIPE_API_BASE:
+        base_addresses['api'] = settings.STRIPE_API_BASE
+        api_key = api_key or 'sk_test_fake'
+    return stripe.StripeClient(
+        api_key,
+        http_client=http_client,
+        base_addresses=base_addresses,
+        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+    )
+
+
+def get_client():
+    """
+    Returns the process-wide StripeClient, creating it on first use.
+    """
+    global _client, _breaker
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _breaker = CircuitBreaker(
+                    settings.STRIPE_BREAKER_FAILURE_THRESHOLD,
+                    settings.STRIPE_BREAKER_RESET_SECONDS)
+                _client = _build_client()
+    return _client
+
+
+def reset_client():
+    """
+    Drops the client and circuit breaker so the next call rebuilds them
+    from the current settings.
+    """
+    global _client, _breaker
+    with _client_lock:
+        _client = None
+        _breaker = None
+
+
+def _record(operation, duration, error):
+    with _metrics_lock:
+        entry = _metrics.setdefault(operation, {
+            'calls': 0, 'errors': 0, 'total_seconds': 0.0,
+            'max_seconds': 0.0})
+        entry['calls'] += 1
+        entry['errors'] += 1 if error is not None else 0
+        entry['total_seconds'] += duration
+        entry['max_seconds'] = max(entry['max_seconds'], duration)
+    logger.debug(
+        "Stripe %s %s in %.2fms", operation,
+        'failed' if error is not None else 'succeeded', duration * 1000)
+    stripe_call.send(
+        sender=None, operation=operation, duration=duration, error=error)
+
+
+def call(operation, method, *args, **kwargs):
+    """
+    Calls a StripeClient service method through the circuit breaker and
+    records its latency and outcome under `operation`.
+    """
+    get_client()
+    if not _breaker.allow():
+        error = StripeUnavailable(
+            "Stripe is temporarily unavailable. Please try again shortly.")
+        _record(operation, 0.0, error)
+        raise error
+
+    started = time.perf_counter()
+    try:
+        result = method(*args, **kwargs)
+    except Exception as e:
+        if isinstance(e, _OUTAGE_ERRORS):
+            _breaker.record_failure()
+        else:
+            _breaker.record_success()
+        _record(operation, time.perf_counter() - started, e)
+        raise
+    _breaker.record_success()
+    _record(operation, time.perf_counter() - started, None)
+    return result
+
+
+def _options(idempotency_key):
+    return {'idempotency_key': idempotency_key} if idempotency_key else {}
+
+
+def retrieve_payment_intent(intent_id):
+    return call(
+        'payment_intents.retrieve',
+        get_client().payment_intents.retrieve, intent_id)
+
+
+def create_payment_intent(idempotency_key=None, **params):
+    return call(
+        'payment_intents.create',
+        get_client().payment_intents.create,
+        params=params, options=_options(idempotency_key))
+
+
+def create_refund(idempotency_key=None, **params):
+    return call(
+        'refunds.create',
+        get_client().refunds.create,
+        params=params, options=_options(idempotency_key))
+
+
+def get_stripe_metrics():
+    """
+    Returns per-operation call and error counts, error rate and mean/max
+    latency for this process, plus the circuit breaker state.
+    """
+    with _metrics_lock:
+        operations = {}
+        for operation, entry in _metrics.items():
+            calls = entry['calls']
+            operations[operation] = {
+                'calls': calls,
+                'errors': entry['errors'],
+                'error_rate': entry['errors'] / calls if calls else 0.0,
+                'avg_latency_ms':
+                    entry['total_seconds'] * 1000 / calls if calls else 0.0,
+                'max_latency_ms': entry['max_seconds'] * 1000,
+            }
+    return {
+        'breaker_state':
+            _breaker.state if _breaker else CircuitBreaker.CLOSED,
+        'operations': operations,
+    }
+
+
+def reset_stripe_metrics():
+    """Clears the counters returned by get_stripe_metrics()."""
+    with _metrics_lock:
+        _metrics.clear()
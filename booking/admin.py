@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Booking, Passenger, BookingPolicy
+from .models import (
+    Booking, Passenger, BookingPolicy, SeatHold, EmailOutbox
+)
+from .search import search_bookings, update_search_index
 from trips.models import Trip
 
 
@@ -29,14 +32,18 @@ class BookingAdmin(admin.ModelAdmin):
         'booking_date',
     )
 
+    # Matched as substrings; references and passenger names, emails and
+    # phone numbers are matched through the booking search index, see
+    # get_search_results.
     search_fields = (
-        'booking_reference',
         'user__username',
         'user__email',
         'trip__origin',
         'trip__destination',
-        'passengers__name',
     )
+    search_help_text = (
+        'Booking reference, passenger name, email or phone number, '
+        'username or email of the booker, or trip origin or destination.')
 
     readonly_fields = (
         'booking_date',
@@ -58,6 +65,17 @@ class BookingAdmin(admin.ModelAdmin):
 
     inlines = [PassengerInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term)
+        if search_term:
+            results |= search_bookings(queryset, search_term)
+        return results, may_have_duplicates
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_index([form.instance.pk])
+
     def user_display(self, obj):
         return obj.user.username if obj.user else "Anonymous"
     user_display.short_description = 'Booked By'
@@ -100,3 +118,22 @@ class BookingPolicyAdmin(admin.ModelAdmin):
             )
         }),
     )
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ('booking', 'trip', 'seats', 'created_at', 'expires_at')
+    list_select_related = ('booking', 'trip')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        'email_type', 'booking', 'status', 'attempts', 'next_attempt_at',
+        'sent_at',
+    )
+    list_filter = ('status', 'email_type')
+    list_select_related = ('booking',)
+    search_fields = ('booking__booking_reference',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
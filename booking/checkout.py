@@ -0,0 +1,84 @@
+"""
+Checkout pipeline for new bookings.
+
+place_booking turns a validated BookingConfirmationForm into a booking in
+one transaction with a fixed number of queries: the seat reservation, the
+booking INSERT, the seat hold, one bulk INSERT for every passenger, the
+booking's search tokens and at most one profile UPDATE, however many
+passengers are travelling.
+"""
+from django.db import transaction
+
+from my_account.models import UserProfile
+from .models import Booking, Passenger
+from .holds import create_seat_hold
+from .search import update_search_index
+
+# Profile fields copied from the first passenger when 'save_info' is ticked.
+PROFILE_FIELDS_FROM_PASSENGER = {
+    'default_name': 'passenger_name1',
+    'default_phone_number': 'passenger_contact_number1',
+    'default_email': 'passenger_email1',
+}
+
+
+def _build_passengers(booking, cleaned_data, num_passengers):
+    """
+    Returns unsaved Passenger instances for each passenger on the form.
+    """
+    return [
+        Passenger(
+            booking=booking,
+            name=cleaned_data[f'passenger_name{i}'],
+            age=cleaned_data.get(f'passenger_age{i}'),
+            contact_number=cleaned_data.get(f'passenger_contact_number{i}'),
+            email=cleaned_data.get(f'passenger_email{i}'),
+        )
+        for i in range(1, num_passengers + 1)
+    ]
+
+
+def _save_profile_defaults(user, cleaned_data):
+    """
+    Stores the first passenger's details as the user's profile defaults
+    with a single UPDATE, creating the profile only if it is missing.
+    """
+    defaults = {
+        profile_field: cleaned_data.get(form_field)
+        for profile_field, form_field in PROFILE_FIELDS_FROM_PASSENGER.items()
+    }
+    if not UserProfile.objects.filter(user=user).update(**defaults):
+        UserProfile.objects.create(user=user, **defaults)
+
+
+def place_booking(form, trip, user, total_price, payment_method_type=None):
+    """
+    Creates a pending booking, its seat hold and its passengers from a
+    valid BookingConfirmationForm and returns the booking.
+
+    Seats are reserved by Booking.save, so this raises SeatsUnavailable
+    (and rolls everything back) when the trip filled up after the form
+    was validated.
+    """
+    cleaned_data = form.cleaned_data
+    num_passengers = form.num_passengers
+
+    with transaction.atomic():
+        booking = Booking.objects.create(
+            user=user,
+            trip=trip,
+            number_of_passengers=num_passengers,
+            total_price=total_price,
+            status='PENDING_PAYMENT',
+            payment_status='PENDING',
+            payment_method_type=payment_method_type,
+        )
+        create_seat_hold(booking)
+        Passenger.objects.bulk_create(
+            _build_passengers(booking, cleaned_data, num_passengers))
+        update_search_index([booking.pk])
+
+        if user is not None and cleaned_data.get('save_info'):
+            _save_profile_defaults(user, cleaned_data)
+
+    return booking
@@ -0,0 +1,133 @@
+"""
+Time-limited seat holds for checkout.
+
+book_trip places a hold on the seats of every new booking. Completing the
+payment step converts the hold into a permanent allocation by deleting
+it. Holds that expire before that are released in bulk: their bookings
+are cancelled and their seats returned with one increment per trip,
+unless a card payment for the booking is still being confirmed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from datetime import timedelta
+
+from trips.inventory import release_seats_by_trip
+from .models import Booking, SeatHold
+from .stats_cache import booking_stats_changed
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+RELEASE_THROTTLE_KEY = 'booking:seat_holds:last_release'
+
+
+def create_seat_hold(booking):
+    """
+    Places a hold on the booking's seats, expiring after
+    SEAT_HOLD_MINUTES.
+    """
+    return SeatHold.objects.create(
+        booking=booking,
+        trip_id=booking.trip_id,
+        seats=booking.number_of_passengers,
+        expires_at=timezone.now() + timedelta(
+            minutes=settings.SEAT_HOLD_MINUTES),
+    )
+
+
+def convert_seat_hold(booking):
+    """
+    Makes the booking's seats permanent by dropping its hold.
+    """
+    SeatHold.objects.filter(booking_id=booking.pk).delete()
+
+
+# A card payment was submitted and Stripe has not confirmed or failed it
+# yet (see booking.utils._is_awaiting_card_confirmation). Its hold is kept
+# past expiry: the success webhook may still arrive, and a failure flags
+# the payment FAILED, after which the hold is released as usual.
+AWAITING_CARD_CONFIRMATION = Q(
+    payment_method_type='CARD',
+    payment_status='PENDING',
+    stripe_payment_intent_id__gt='',
+)
+
+
+def release_expired_seat_holds(now=None, batch_size=500):
+    """
+    Releases expired holds in batches and returns the number of bookings
+    cancelled. Bookings awaiting a card confirmation are left alone.
+
+    Each batch runs in its own transaction: the expired holds are locked
+    (skipping rows another worker is releasing), their bookings locked and
+    re-checked, the ones still unpaid cancelled with one UPDATE, and their
+    seats returned with one increment per trip.
+    """
+    now = now or timezone.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            holds = list(SeatHold.objects.select_for_update(
+                skip_locked=True, of=('self',)
+            ).filter(
+                expires_at__lte=now,
+                booking__status='PENDING_PAYMENT',
+            ).exclude(
+                booking__in=Booking.objects.filter(
+                    AWAITING_CARD_CONFIRMATION)
+            ).values_list('id', 'booking_id')[:batch_size])
+            if not holds:
+                break
+
+            booking_ids = set(Booking.objects.select_for_update().filter(
+                id__in=[booking_id for hold_id, booking_id in holds],
+                status='PENDING_PAYMENT',
+            ).exclude(
+                AWAITING_CARD_CONFIRMATION
+            ).values_list('id', flat=True))
+            hold_ids = [
+                hold_id for hold_id, booking_id in holds
+                if booking_id in booking_ids]
+            if not hold_ids:
+                continue
+
+            seats_by_trip_id = dict(SeatHold.objects.filter(
+                id__in=hold_ids
+            ).values('trip_id').annotate(
+                seats=Sum('seats')
+            ).order_by().values_list('trip_id', 'seats'))
+
+            Booking.objects.filter(id__in=booking_ids).update(
+                status='CANCELED',
+                payment_status='FAILED',
+            )
+            SeatHold.objects.filter(id__in=hold_ids).delete()
+            release_seats_by_trip(seats_by_trip_id)
+            booking_stats_changed(booking_ids)
+
+            released += len(hold_ids)
+
+    # Holds whose booking was already settled some other way.
+    SeatHold.objects.filter(expires_at__lte=now).exclude(
+        booking__status='PENDING_PAYMENT').delete()
+
+    if released:
+        logger.info("Released %s expired seat hold(s).", released)
+    return released
+
+
+def maybe_release_expired_seat_holds():
+    """
+    Opportunistic sweep run from request handlers, at most once per
+    SEAT_HOLD_RELEASE_INTERVAL seconds across all workers sharing the
+    cache.
+    """
+    if cache.add(
+            RELEASE_THROTTLE_KEY, True,
+            timeout=settings.SEAT_HOLD_RELEASE_INTERVAL):
+        release_expired_seat_holds()
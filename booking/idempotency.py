@@ -0,0 +1,108 @@
+"""
+Idempotency keys for booking and payment form submissions.
+
+Each rendered form carries a fresh key in a hidden `idempotency_key`
+input. The first POST with a key claims it and records the redirect its
+view returns; repeated POSTs with the same key get that redirect back
+without running the view again, so a double-submitted form never books,
+reserves seats or calls Stripe twice.
+"""
+from django.conf import settings
+from django.db import IntegrityError
+from django.shortcuts import redirect
+from django.utils import timezone
+from datetime import timedelta
+from functools import wraps
+
+from .models import IdempotencyKey
+
+import logging
+import re
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_FIELD = 'idempotency_key'
+KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+POLL_INTERVAL = 0.25
+
+
+def new_idempotency_key():
+    """
+    Returns a fresh key for a form about to be rendered.
+    """
+    return uuid.uuid4().hex
+
+
+def _wait_for_response_url(claim):
+    """
+    Waits up to IDEMPOTENCY_WAIT_SECONDS for the request holding the claim
+    to record its redirect, and returns it ('' if it never did).
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while not claim.response_url and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        claim.response_url = IdempotencyKey.objects.filter(
+            pk=claim.pk).values_list('response_url', flat=True).first() or ''
+    return claim.response_url
+
+
+def idempotent_post(scope):
+    """
+    Decorates a view so POSTs carrying an idempotency key run at most once.
+
+    A repeated key is answered with the first request's redirect, waiting
+    briefly if that request is still running. Responses that are not
+    redirects (e.g. a form re-rendered with errors) and exceptions release
+    the key so the submission can be retried.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.POST.get(IDEMPOTENCY_FIELD, '') \
+                if request.method == 'POST' else ''
+            if not KEY_PATTERN.match(key):
+                return view_func(request, *args, **kwargs)
+
+            action = request.POST.get('action')
+            claim_scope = f"{scope}:{action}" if action else scope
+            try:
+                claim = IdempotencyKey.objects.create(
+                    scope=claim_scope,
+                    key=key,
+                    expires_at=timezone.now() + timedelta(
+                        hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+            except IntegrityError:
+                claim = IdempotencyKey.objects.get(
+                    scope=claim_scope, key=key)
+                response_url = _wait_for_response_url(claim)
+                logger.info(
+                    "Replaying %s submission %s.", claim_scope, key)
+                return redirect(response_url or request.get_full_path())
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                claim.delete()
+                raise
+
+            if response.status_code in (301, 302) and \
+                    response.has_header('Location'):
+                claim.response_url = response['Location'][:255]
+                claim.save(update_fields=['response_url'])
+            else:
+                claim.delete()
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_idempotency_keys(now=None):
+    """
+    Deletes expired keys and returns how many were removed.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(
+        expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0015_alter_booking_original_departure_time'),
+        ('trips', '0010_trip_available_seats_non_negative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_hold', to='booking.booking')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='trips.trip')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0018_emailoutbox'),
+        ('trips', '0010_trip_available_seats_non_negative'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'PENDING_PAYMENT')), fields=['booking_date'], name='booking_pending_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'PENDING_PAYMENT')), fields=['trip'], name='booking_pending_trip_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0019_booking_pending_partial_indexes'),
+        ('trips', '0010_trip_available_seats_non_negative'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date'], name='booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('refund_status', 'PENDING'), ('status', 'CANCELED')), fields=['booking_date'], name='booking_refund_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import re
+import unicodedata
+
+BATCH_SIZE = 1000
+
+
+# A frozen copy of booking.search.booking_tokens as of this migration, so
+# later changes to the live tokenizer don't change what it writes.
+def _words(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).lower()
+    return re.findall(r'[a-z0-9]+', text)
+
+
+def _phone_tokens(contact_number):
+    digits = re.sub(r'\D', '', contact_number or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if not digits:
+        return set()
+    if digits.startswith('63'):
+        national = digits[2:]
+    else:
+        national = digits.removeprefix('0')
+    tokens = {digits, '0' + national, '63' + national}
+    tokens.update(
+        digits[-length:] for length in range(7, 11)
+        if len(digits) > length)
+    return tokens
+
+
+def _booking_tokens(booking_reference, passengers):
+    tokens = set(_words(booking_reference))
+    tokens.add(''.join(_words(booking_reference)))
+    for name, email, contact_number in passengers:
+        tokens.update(_words(name))
+        tokens.update(_words(email))
+        tokens.update(_phone_tokens(contact_number))
+    return {token[:100] for token in tokens if len(token) >= 2}
+
+
+def _index_batch(Passenger, BookingSearchToken, batch):
+    passengers = {booking_id: [] for booking_id in batch}
+    for booking_id, *fields in Passenger.objects.filter(
+            booking_id__in=batch).values_list(
+            'booking_id', 'name', 'email', 'contact_number'):
+        passengers[booking_id].append(fields)
+    BookingSearchToken.objects.bulk_create(
+        [
+            BookingSearchToken(booking_id=booking_id, token=token)
+            for booking_id, reference in batch.items()
+            for token in _booking_tokens(reference, passengers[booking_id])
+        ],
+        batch_size=BATCH_SIZE)
+
+
+def build_search_index(apps, schema_editor):
+    """
+    Indexes existing bookings, streamed a thousand at a time.
+    """
+    Booking = apps.get_model('booking', 'Booking')
+    Passenger = apps.get_model('booking', 'Passenger')
+    BookingSearchToken = apps.get_model('booking', 'BookingSearchToken')
+    batch = {}
+    for booking_id, reference in Booking.objects.order_by('pk').values_list(
+            'pk', 'booking_reference').iterator(chunk_size=BATCH_SIZE):
+        batch[booking_id] = reference
+        if len(batch) == BATCH_SIZE:
+            _index_batch(Passenger, BookingSearchToken, batch)
+            batch = {}
+    if batch:
+        _index_batch(Passenger, BookingSearchToken, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0020_booking_date_refund_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='booking.booking')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'booking'], name='booking_search_token_idx', opclasses=['varchar_pattern_ops', 'int8_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'token'), name='unique_booking_search_token')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
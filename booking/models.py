@@ -1,10 +1,16 @@
 from django.db import models, transaction
-from django.contrib.auth.models import User
 from django.utils import timezone
+from django.contrib.auth.models import User
 from trips.models import Trip
+from trips.inventory import reserve_seats, release_seats, SeatsUnavailable
 from decimal import Decimal
-from datetime import datetime
-from .utils import send_booking_email
+from .utils import send_booking_email, generate_booking_reference
+from .stats_cache import booking_stats_changed
+from .search import update_search_index
+
+import logging
+
+logger = logging.getLogger(__name__)
 
 BOOKING_STATUS_CHOICES = [
     ('PENDING_PAYMENT', 'Pending Payment'),
@@ -15,6 +21,9 @@ BOOKING_STATUS_CHOICES = [
     ('RESCHEDULED', 'Rescheduled'),
 ]
 
+# Bookings in these statuses no longer hold seats on their trip.
+SEAT_RELEASING_STATUSES = ('CANCELED', 'RESCHEDULED')
+
 PAYMENT_STATUS_CHOICES = [
     ('PENDING', 'Pending Payment'),
     ('PAID', 'Paid'),
@@ -145,82 +154,175 @@ class Booking(models.Model):
         ordering = ['-booking_date']
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
+        # booking_date_idx serves newest-first listings and the
+        # dashboard's recent-bookings range. The partial indexes serve the
+        # abandoned-booking and pending-refund scans, which only ever look
+        # at a small set of bookings.
+        indexes = [
+            models.Index(fields=['booking_date'], name='booking_date_idx'),
+            models.Index(
+                fields=['booking_date'],
+                condition=models.Q(status='PENDING_PAYMENT'),
+                name='booking_pending_date_idx'),
+            models.Index(
+                fields=['trip'],
+                condition=models.Q(status='PENDING_PAYMENT'),
+                name='booking_pending_trip_idx'),
+            models.Index(
+                fields=['booking_date'],
+                condition=models.Q(status='CANCELED', refund_status='PENDING'),
+                name='booking_refund_pending_idx'),
+        ]
+
+    # Fields save() compares against their loaded values.
+    TRACKED_FIELDS = ('status', 'payment_status', 'number_of_passengers',
+                      'trip_id', 'refund_status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Keeps the values loaded from the database so save() can tell what
+        changed without fetching the booking again.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _get_loaded_values(self):
+        """
+        Returns the tracked field values as last loaded or saved. Falls back
+        to one query for instances that were not loaded from the database.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None and \
+                all(field in loaded for field in self.TRACKED_FIELDS):
+            return {field: loaded[field] for field in self.TRACKED_FIELDS}
+        return Booking.objects.filter(pk=self.pk).values(
+            *self.TRACKED_FIELDS).first() or {}
+
+    def _saved_tracked_fields(self, update_fields):
+        """
+        Returns the tracked fields a save with update_fields writes.
+        """
+        if update_fields is None:
+            return set(self.TRACKED_FIELDS)
+        names = {'trip_id' if name == 'trip' else name
+                 for name in update_fields}
+        return names.intersection(self.TRACKED_FIELDS)
+
+    def _apply_transition(self, saved_fields):
+        """
+        Writes the saved tracked fields with one UPDATE conditional on the
+        row still holding the loaded values, and returns the values the
+        row held before. If another write got there first (e.g. a bulk
+        UPDATE cancelling an expired hold), this instance is stale: its
+        tracked fields are reloaded from the locked row and kept, so the
+        save moves no seats and cannot undo that write.
+        """
+        before = self._get_loaded_values()
+        changes = {field: getattr(self, field) for field in saved_fields}
+        if before and Booking.objects.filter(
+                pk=self.pk, **before).update(**changes):
+            return before
+        Booking.objects.select_for_update().filter(pk=self.pk).exists()
+        self.refresh_from_db(fields=[
+            'trip' if field == 'trip_id' else field
+            for field in self.TRACKED_FIELDS])
+        self._loaded_values = {
+            field: getattr(self, field) for field in self.TRACKED_FIELDS}
+        logger.warning(
+            "Booking %s changed since it was loaded; kept its stored "
+            "status and seats.", self.pk)
+        return dict(self._loaded_values)
 
     def save(self, *args, **kwargs):
         """
         Overrides the save method to handle:
         1. Setting original departure time on creation.
-        2. Storing original status for comparison.
-        3. Generating booking reference (if new).
-        4. Updating trip's available seats based on status changes.
-        5. Triggering confirmation/receipt emails on status
-            transition to PAID/CONFIRMED.
+        2. Comparing against the values loaded with the instance, applying
+            the change as an UPDATE conditional on them.
+        3. Generating booking reference (if new) before the INSERT.
+        4. Reserving or releasing trip seats through the seat inventory
+            when the booking is created, its passenger count changes, or
+            it moves into or out of a seat-releasing status. Raises
+            SeatsUnavailable when the trip is full. Saves whose
+            update_fields leave out every tracked field move no seats.
+        5. Queueing confirmation/receipt emails, in the same transaction,
+            on status transition to PAID/CONFIRMED.
+        6. Invalidating cached booking statistics when the booking is
+            created or its status, payment status or refund status
+            changes.
         """
         is_new_booking = not self.pk
-        original_payment_status = None
-        original_booking_status = None
-        original_num_passengers = 0
+        saved_fields = self._saved_tracked_fields(kwargs.get('update_fields'))
+        if not is_new_booking and not saved_fields:
+            return super().save(*args, **kwargs)
 
         if is_new_booking and not self.original_departure_time:
-            combined_datetime = datetime.combine(
-                self.trip.date, self.trip.departure_time
-                )
-            self.original_departure_time = timezone.make_aware(
-                combined_datetime
-                )
-
-        if not is_new_booking:
-            try:
-                original_booking = Booking.objects.get(pk=self.pk)
-                original_payment_status = original_booking.payment_status
-                original_booking_status = original_booking.status
-                original_num_passengers = original_booking.number_of_passengers
-            except Booking.DoesNotExist:
-                pass
-
-        if is_new_booking:
-            if self.status in ['PENDING', 'CONFIRMED']:
-                if self.trip.available_seats is not None:
-                    self.trip.available_seats -= self.number_of_passengers
-                    self.trip.save()
-        elif original_booking:
-            if self.number_of_passengers != original_num_passengers:
-                passenger_diff = (
-                    self.number_of_passengers) - (
-                        original_booking.number_of_passengers)
-                if self.trip.available_seats is not None:
-                    self.trip.available_seats -= passenger_diff
-                    self.trip.save()
-
-        if self.status == 'CANCELED' and original_booking_status != 'CANCELED':
-            if self.trip.available_seats is not None:
-                self.trip.available_seats += self.number_of_passengers
-                self.trip.save(update_fields=['available_seats'])
-
-        super().save(*args, **kwargs)
+            self.original_departure_time = self.trip.departure_at
 
         if is_new_booking and not self.booking_reference:
-            user_identifier = self.user.id if self.user else "ANON"
-            trip_identifier = self.trip.pk
-            self.booking_reference = (
-                f"BKODA-{user_identifier}-{trip_identifier}-{self.pk}-"
-                f"{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            self.booking_reference = generate_booking_reference()
+
+        # Seats, the row and its queued emails commit or roll back together.
+        with transaction.atomic(savepoint=False):
+            before = {}
+            if not is_new_booking:
+                before = self._apply_transition(saved_fields)
+            after = dict(before)
+            after.update(
+                (field, getattr(self, field))
+                for field in self.TRACKED_FIELDS
+                if is_new_booking or field in saved_fields)
+
+            seats_held_before = 0
+            if before and before['status'] not in SEAT_RELEASING_STATUSES:
+                seats_held_before = before['number_of_passengers']
+            seats_needed = 0
+            if after['status'] not in SEAT_RELEASING_STATUSES:
+                seats_needed = after['number_of_passengers']
+
+            is_now_paid_and_confirmed = (
+                after['payment_status'] == 'PAID' and
+                after['status'] == 'CONFIRMED'
+            )
+            was_not_paid_and_confirmed_before = (
+                before.get('payment_status') != 'PAID' or
+                before.get('status') != 'CONFIRMED'
             )
-            super().save(update_fields=['booking_reference'])
-
-        is_now_paid_and_confirmed = (
-            self.payment_status == 'PAID' and self.status == 'CONFIRMED'
-        )
-        was_not_paid_and_confirmed_before = (
-            original_payment_status != 'PAID' or
-            original_booking_status != 'CONFIRMED'
-        )
 
-        if is_now_paid_and_confirmed and was_not_paid_and_confirmed_before:
-            transaction.on_commit(
-                lambda: send_booking_email(self, 'payment_receipt'))
-            transaction.on_commit(
-                lambda: send_booking_email(self, 'booking_confirmation'))
+            trip = self.trip if after['trip_id'] == self.trip_id else \
+                Trip.objects.get(pk=after['trip_id'])
+            if before and before['trip_id'] != after['trip_id']:
+                release_seats(Trip.objects.get(pk=before['trip_id']),
+                              seats_held_before)
+                seats_held_before = 0
+
+            seat_delta = seats_needed - seats_held_before
+            if seat_delta > 0 and not reserve_seats(trip, seat_delta):
+                raise SeatsUnavailable(
+                    f"Only {trip.available_seats} seats are left on "
+                    f"trip {trip.trip_number}.")
+            if seat_delta < 0:
+                release_seats(trip, -seat_delta)
+            if seats_held_before and not seats_needed:
+                SeatHold.objects.filter(booking_id=self.pk).delete()
+
+            super().save(*args, **kwargs)
+
+            if is_new_booking or any(
+                    before.get(field) != after[field]
+                    for field in ('status', 'payment_status',
+                                  'refund_status')):
+                booking_stats_changed(
+                    None if is_new_booking else [self.pk])
+
+            if is_now_paid_and_confirmed and \
+                    was_not_paid_and_confirmed_before:
+                send_booking_email(self, 'payment_receipt')
+                send_booking_email(self, 'booking_confirmation')
+
+        self._loaded_values = after
 
     def is_pending_reschedule(self):
         return self.status == 'PENDING_PAYMENT' and\
@@ -243,11 +345,157 @@ class Passenger(models.Model):
     contact_number = models.CharField(max_length=15, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the passenger and refreshes its booking's search tokens.
+        """
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            update_search_index([self.booking_id])
+
+    def delete(self, *args, **kwargs):
+        booking_id = self.booking_id
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            update_search_index([booking_id])
+        return result
+
     def __str__(self):
         booking_ref_display = self.booking.booking_reference or 'N/A'
         return f"{self.name} (Booking: {booking_ref_display})"
 
 
+class BookingSearchToken(models.Model):
+    """
+    One normalized word of a booking's reference or of its passengers'
+    names, emails and phone numbers. See booking.search.
+    """
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='search_tokens'
+    )
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['booking', 'token'],
+                name='unique_booking_search_token'),
+        ]
+        # Prefix lookups (LIKE 'term%') on PostgreSQL need the pattern
+        # operator class; the booking id makes them index-only scans.
+        indexes = [
+            models.Index(
+                fields=['token', 'booking'],
+                opclasses=['varchar_pattern_ops', 'int8_ops'],
+                name='booking_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} (booking {self.booking_id})"
+
+
+class SeatHold(models.Model):
+    """
+    A time-limited lease on the seats of a booking awaiting checkout.
+
+    The seats are already taken from the trip when the booking is created,
+    so search results account for active holds without looking at this
+    table. Completing checkout deletes the hold; holds that expire first
+    are released in bulk and their bookings cancelled.
+    """
+    booking = models.OneToOneField(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='seat_hold'
+    )
+    trip = models.ForeignKey(
+        Trip,
+        on_delete=models.CASCADE,
+        related_name='seat_holds'
+    )
+    seats = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return (f"{self.seats} seat(s) on trip {self.trip_id} for booking "
+                f"{self.booking_id} until {self.expires_at}")
+
+
+OUTBOX_STATUS_CHOICES = [
+    ('PENDING', 'Pending'),
+    ('SENDING', 'Sending'),
+    ('SENT', 'Sent'),
+    ('FAILED', 'Failed'),
+]
+
+
+class EmailOutbox(models.Model):
+    """
+    A booking email waiting to be sent by the send_queued_emails command.
+
+    Rows are written in the same transaction as the booking change they
+    describe. The worker renders and sends them in batches, retrying
+    failures with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='queued_emails'
+    )
+    email_type = models.CharField(max_length=40)
+    fallback_recipient = models.EmailField(blank=True)
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=OUTBOX_STATUS_CHOICES,
+        default='PENDING'
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        verbose_name_plural = 'Email outbox'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.email_type} for booking {self.booking_id} " \
+            f"({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A claimed form submission and the redirect it produced, so repeated
+    submissions of the same rendered form can be answered with the
+    original redirect. Rows expire after IDEMPOTENCY_KEY_TTL_HOURS.
+    """
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=32)
+    response_url = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'key'],
+                name='unique_idempotency_scope_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
 class BookingPolicy(models.Model):
     """
     Defines the rules for booking cancellation and rescheduling.
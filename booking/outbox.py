@@ -0,0 +1,113 @@
+"""
+Delivery of queued booking emails.
+
+Request handlers only write EmailOutbox rows (see send_booking_email).
+send_queued_emails() claims due rows with a short lease, renders them,
+sends the batch over one SMTP connection and records the outcome. Failed
+emails are retried with exponential backoff; rows left in SENDING by a
+crashed worker become due again once their lease runs out.
+"""
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import EmailOutbox
+from .utils import build_booking_email, prefetch_email_data
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _claim_batch(batch_size, now):
+    """
+    Leases up to batch_size due emails to this worker and returns them.
+    """
+    with transaction.atomic():
+        ids = list(EmailOutbox.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            status__in=['PENDING', 'SENDING'],
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at').values_list('id', flat=True)[
+            :batch_size])
+        EmailOutbox.objects.filter(id__in=ids).update(
+            status='SENDING',
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(
+                seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+        )
+    entries = list(EmailOutbox.objects.filter(id__in=ids).select_related(
+        'booking__user', 'booking__trip'))
+    prefetch_email_data(entry.booking for entry in entries)
+    return entries
+
+
+def _mark_failed(entry, error, now):
+    """
+    Schedules a retry with exponential backoff, or gives up after
+    EMAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+    entry.last_error = str(error)[:2000]
+    if entry.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        entry.status = 'FAILED'
+        logger.error(
+            "Giving up on email %s for booking %s after %s attempts: %s",
+            entry.email_type, entry.booking_id, entry.attempts, error)
+    else:
+        entry.status = 'PENDING'
+        entry.next_attempt_at = now + timedelta(
+            seconds=settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS *
+            2 ** (entry.attempts - 1))
+    entry.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+
+
+def send_queued_emails(batch_size=None):
+    """
+    Sends one batch of due emails and returns (sent, failed).
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    entries = _claim_batch(batch_size, now)
+    if not entries:
+        return 0, 0
+
+    delivered = []
+    skipped = []
+    failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for entry in entries:
+            _mark_failed(entry, e, now)
+        return 0, len(entries)
+
+    try:
+        for entry in entries:
+            try:
+                email = build_booking_email(
+                    entry.booking, entry.email_type,
+                    fallback_recipient=entry.fallback_recipient,
+                    **entry.context)
+                if email is not None:
+                    email.connection = connection
+                    email.send()
+            except Exception as e:
+                _mark_failed(entry, e, now)
+                failed += 1
+                continue
+            (delivered if email is not None else skipped).append(entry.id)
+    finally:
+        connection.close()
+
+    sent_at = timezone.now()
+    EmailOutbox.objects.filter(id__in=delivered).update(
+        status='SENT', sent_at=sent_at, last_error='')
+    EmailOutbox.objects.filter(id__in=skipped).update(
+        status='SENT', sent_at=sent_at,
+        last_error='No recipient or unknown email type; skipped.')
+    return len(delivered) + len(skipped), failed
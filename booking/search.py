@@ -0,0 +1,147 @@
+"""
+Booking search index.
+
+Staff look bookings up by reference, passenger name, email or phone
+number. Rather than joining every passenger row with `icontains` and
+de-duplicating, each booking's searchable text is split into normalized
+tokens (lower case, accents stripped, phone numbers reduced to digits
+in several forms) and stored in BookingSearchToken. A search term matches a booking when
+every one of its tokens is the prefix of one of the booking's tokens,
+which an index on the token column answers without scanning passengers.
+
+The index is rewritten whenever a booking's passengers change; the
+rebuild_booking_search_index command backfills it for existing bookings.
+"""
+from django.db import transaction
+
+import re
+import unicodedata
+
+# Longer tokens are truncated; prefix matching still finds them. Shorter
+# ones, such as initials, would match far too many bookings and are not
+# indexed.
+MAX_TOKEN_LENGTH = 100
+MIN_TOKEN_LENGTH = 2
+
+# A search term made only of these characters and at least this many
+# digits is treated as one phone number, e.g. '+63 917-123 4567'.
+_PHONE_PATTERN = re.compile(r'^[\d\s()+.-]+$')
+MIN_PHONE_DIGITS = 4
+
+# Phone numbers are indexed in international ('63917...') and national
+# ('0917...') form, and by their last 7 to 10 digits, so a number is
+# found however its prefix was stored or typed.
+COUNTRY_CALLING_CODE = '63'
+PHONE_SUFFIX_LENGTHS = range(7, 11)
+
+
+def normalize(text):
+    """Returns text in lower case with accents stripped."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).lower()
+
+
+def _words(text):
+    return re.findall(r'[a-z0-9]+', normalize(text))
+
+
+def _phone_digits(text):
+    digits = re.sub(r'\D', '', text or '')
+    # '0063 917...' is '+63 917...' with the international call prefix.
+    if digits.startswith('00'):
+        digits = digits[2:]
+    return digits
+
+
+def _phone_tokens(contact_number):
+    digits = _phone_digits(contact_number)
+    if not digits:
+        return set()
+    if digits.startswith(COUNTRY_CALLING_CODE):
+        national = digits[len(COUNTRY_CALLING_CODE):]
+    else:
+        national = digits.removeprefix('0')
+    tokens = {digits, '0' + national, COUNTRY_CALLING_CODE + national}
+    tokens.update(
+        digits[-length:] for length in PHONE_SUFFIX_LENGTHS
+        if len(digits) > length)
+    return tokens
+
+
+def _as_phone_number(term):
+    digits = _phone_digits(term)
+    if _PHONE_PATTERN.match(term) and len(digits) >= MIN_PHONE_DIGITS:
+        return digits
+    return None
+
+
+def booking_tokens(booking_reference, passengers):
+    """
+    Returns the set of tokens for a booking reference and an iterable of
+    (name, email, contact_number) tuples.
+    """
+    tokens = set(_words(booking_reference))
+    # 'BK01J...' and 'R-BK01J...' are also found when typed in full.
+    tokens.add(''.join(_words(booking_reference)))
+    for name, email, contact_number in passengers:
+        tokens.update(_words(name))
+        tokens.update(_words(email))
+        tokens.update(_phone_tokens(contact_number))
+    return {
+        token[:MAX_TOKEN_LENGTH] for token in tokens
+        if len(token) >= MIN_TOKEN_LENGTH}
+
+
+def update_search_index(booking_ids):
+    """
+    Rewrites the search tokens of the given bookings from their current
+    reference and passengers, with one DELETE and one bulk INSERT.
+    """
+    from .models import Booking, Passenger, BookingSearchToken
+
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return
+
+    passengers = {booking_id: [] for booking_id in booking_ids}
+    for booking_id, *fields in Passenger.objects.filter(
+            booking_id__in=booking_ids).values_list(
+            'booking_id', 'name', 'email', 'contact_number'):
+        passengers[booking_id].append(fields)
+
+    rows = [
+        BookingSearchToken(booking_id=booking_id, token=token)
+        for booking_id, reference in Booking.objects.filter(
+            pk__in=booking_ids).values_list('pk', 'booking_reference')
+        for token in booking_tokens(reference, passengers[booking_id])
+    ]
+
+    with transaction.atomic():
+        BookingSearchToken.objects.filter(
+            booking_id__in=booking_ids).delete()
+        BookingSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+def search_bookings(queryset, term):
+    """
+    Filters a booking queryset to the bookings matching every token of
+    the search term. Needs no distinct(): each token is one
+    `pk IN (...)` subquery on the index.
+    """
+    from .models import BookingSearchToken
+
+    phone_number = _as_phone_number(term)
+    terms = [phone_number] if phone_number else _words(term)
+    # Words too short to be indexed can only match as the prefix of a
+    # longer token; they are dropped when the term has longer words.
+    if any(len(token) >= MIN_TOKEN_LENGTH for token in terms):
+        terms = [
+            token for token in terms if len(token) >= MIN_TOKEN_LENGTH]
+    for token in terms:
+        queryset = queryset.filter(
+            pk__in=BookingSearchToken.objects.filter(
+                token__startswith=token[:MAX_TOKEN_LENGTH]
+            ).values('booking_id'))
+    return queryset
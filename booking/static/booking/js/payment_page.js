@@ -130,6 +130,39 @@ $(document).ready(function () {
         stripe = null;
     }
 
+    // --- Lazy PaymentIntent ---
+
+    let clientSecretPromise = null;
+
+    /**
+     * Asks the server for the booking's PaymentIntent the first time it is
+     * needed, so cash and GCash bookings never create one.
+     * Returns a promise resolving to the client secret.
+     */
+    function fetchClientSecret() {
+        if (!clientSecretPromise) {
+            clientSecretPromise = fetch($('#payment-intent-url').data('url'), {
+                method: 'POST',
+                headers: {
+                    'X-CSRFToken': $('input[name="csrfmiddlewaretoken"]').val(),
+                    'Accept': 'application/json',
+                },
+            })
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.client_secret) {
+                        throw new Error(data.error || 'Missing client secret.');
+                    }
+                    return data.client_secret;
+                })
+                .catch(error => {
+                    clientSecretPromise = null;
+                    throw error;
+                });
+        }
+        return clientSecretPromise;
+    }
+
     // --- Payment Method Toggle Logic ---
 
     /**
@@ -146,6 +179,7 @@ $(document).ready(function () {
             submitButton.text('Confirm Card Payment');
             cardErrors.text('');
             initializeStripe();
+            fetchClientSecret().catch(() => {});
             toggleBillingAddressFields(); 
         } else if (selectedMethod === 'CASH' || selectedMethod === 'GCASH'){
             cardPaymentDetails.css('display', 'none');
@@ -267,7 +301,12 @@ $(document).ready(function () {
             }
 
             const billingDetails = getBillingDetails();
-            const currentClientSecret = $('#id_client_secret').text().slice(1, -1);
+            let currentClientSecret = null;
+            try {
+                currentClientSecret = await fetchClientSecret();
+            } catch (intentError) {
+                currentClientSecret = null;
+            }
 
             if (!currentClientSecret) {
                 cardErrors.html(`
@@ -0,0 +1,67 @@
+"""
+Booking statistics cache.
+
+Staff pages show counts that are expensive to recompute on every request.
+They are cached for BOOKING_STATS_CACHE_TIMEOUT seconds under keys that
+embed a version counter; any change to a booking's state bumps the
+counter once its transaction commits, so stale counts are never read
+again and simply expire. Changes to bookings from days already in the
+DailyBookingStats rollup also recompute those days.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+import time
+
+VERSION_KEY = 'booking:stats:version'
+
+
+def _get_version():
+    """
+    Returns the current version. A missing version starts from the current
+    time in milliseconds, so an evicted counter can never fall back to a
+    value that older entries were written under.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def _rollup_bookings(booking_ids):
+    from staff_app.models import DailyBookingStats
+    DailyBookingStats.rollup_bookings(booking_ids)
+
+
+def booking_stats_changed(booking_ids=None):
+    """
+    Invalidates every cached booking statistic once the surrounding
+    transaction commits. booking_ids (ids, or a queryset of them) are the
+    bookings that changed; the rolled-up days they were made on are
+    recomputed first, so the daily rollup never keeps their old state.
+    """
+    if booking_ids is not None:
+        transaction.on_commit(
+            lambda: _rollup_bookings(booking_ids), robust=True)
+    transaction.on_commit(_bump_version, robust=True)
+
+
+def cached_booking_stats(name, compute):
+    """
+    Returns the cached statistic `name`, calling compute() on a miss.
+    """
+    key = f"booking:stats:{name}:{_get_version()}"
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.BOOKING_STATS_CACHE_TIMEOUT)
+    return value
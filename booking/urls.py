@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from .webhooks import webhook
 
 
 urlpatterns = [
@@ -13,9 +14,20 @@ urlpatterns = [
         views.process_payment,
         name='process_payment'
         ),
+    path(
+        'payment/<int:booking_id>/intent/',
+        views.create_payment_intent,
+        name='create_payment_intent'
+        ),
     path(
         'booking_success/<int:booking_id>/',
         views.booking_success,
         name='booking_success'
         ),
+    path(
+        'payment/<int:booking_id>/status/',
+        views.booking_payment_status,
+        name='booking_payment_status'
+        ),
+    path('wh/', webhook, name='webhook'),
 ]
@@ -1,110 +1,228 @@
 from django.core.mail import EmailMultiAlternatives
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch, prefetch_related_objects
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.dispatch import receiver
+from django.template.loader import get_template
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.autoreload import file_changed
 
+from bkoda import stripe_gateway
 from my_account.models import UserProfile
 from trips.models import Trip
 from datetime import datetime, timedelta
 
+import json
 import logging
+import secrets
+import time
 
 logger = logging.getLogger(__name__)
 
+# Crockford's base32: no I, L, O or U, so codes read back unambiguously.
+REFERENCE_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+REFERENCE_PREFIX = 'BK'
+
+
+def _encode_base32(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(REFERENCE_ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def generate_booking_reference():
+    """
+    Returns a short booking reference such as 'BK01JABCDE7Q4XM2NP'.
+
+    The first ten characters after the prefix encode the creation time in
+    milliseconds and the last six are random (30 bits), so references sort
+    by creation time and can be assigned before the row is inserted.
+    """
+    timestamp = _encode_base32(time.time_ns() // 1_000_000, 10)
+    randomness = _encode_base32(secrets.randbits(30), 6)
+    return f"{REFERENCE_PREFIX}{timestamp}{randomness}"
+
 
 def send_booking_email(booking, email_type, booking_form_data=None, **kwargs):
-    subject = ''
-    html_template_name = ''
+    """
+    Queues a booking email in the EmailOutbox.
+
+    The row is written in the caller's transaction, so the email is only
+    sent if the booking change it describes commits. The send_queued_emails
+    command renders and delivers it. Extra keyword arguments are passed to
+    the template and must be JSON serializable (Decimals become strings).
+    """
+    from .models import EmailOutbox
+    fallback_recipient = ''
+    if booking_form_data and booking_form_data.get('passenger_email1'):
+        fallback_recipient = booking_form_data.get('passenger_email1')
+
+    return EmailOutbox.objects.create(
+        booking=booking,
+        email_type=email_type,
+        fallback_recipient=fallback_recipient,
+        context=json.loads(json.dumps(kwargs, cls=DjangoJSONEncoder)),
+        next_attempt_at=timezone.now(),
+    )
 
-    user = booking.user if booking.user else None
-    recipient_email = user.email if user and user.email else None
 
-    if not recipient_email and booking.passengers.exists():
-        recipient_email = booking.passengers.first().email
+def queue_booking_emails(booking_ids, email_type):
+    """
+    Queues the same email for each of booking_ids with one INSERT, in the
+    caller's transaction like send_booking_email.
+    """
+    from .models import EmailOutbox
+    now = timezone.now()
+    return EmailOutbox.objects.bulk_create(
+        EmailOutbox(booking_id=booking_id, email_type=email_type,
+                    next_attempt_at=now)
+        for booking_id in booking_ids)
+
+
+# email_type: (subject, template path without the .html/.txt extension)
+EMAIL_TYPES = {
+    'pending_payment_instructions': (
+        "Your Booking is Pending Payment -Reference: {reference}",
+        'emails/pending_payment_email'),
+    'payment_receipt': (
+        "Payment Receipt for Booking {reference}",
+        'emails/payment_receipt_email'),
+    'booking_confirmation': (
+        "Your Booking is Confirmed! Reference:{reference}",
+        'emails/booking_confirmation_email'),
+    'cancellation_unpaid': (
+        "Booking {reference} Has Been Cancelled (Unpaid)",
+        'emails/cancellation_unpaid_email'),
+    'cancellation': (
+        "Your Booking {reference} Has Been Cancelled",
+        'emails/cancellation_email'),
+    'refund_processing': (
+        "Refund Processing for Booking {reference}",
+        'emails/refund_processing_email'),
+    'rescheduled_confirmation': (
+        "Your Booking {reference} Has Been Rescheduled!",
+        'emails/rescheduled_confirmation_email'),
+}
+
+_compiled_email_templates = {}
+
+
+def prefetch_email_data(bookings):
+    """
+    Loads the user, trip and passengers of many bookings at once, so
+    building their emails needs at most three queries in total. Relations
+    that are already loaded (e.g. via select_related) are not fetched
+    again. Returns the bookings as a list.
+    """
+    from .models import Passenger
+    bookings = list(bookings)
+    prefetch_related_objects(
+        bookings, 'user', 'trip',
+        Prefetch('passengers', queryset=Passenger.objects.order_by('pk')))
+    return bookings
 
-    if not recipient_email and booking_form_data and booking_form_data.get(
-        'passenger_email1'
-    ):
-        recipient_email = booking_form_data.get('passenger_email1')
+
+def build_email_context(booking, fallback_recipient='', **kwargs):
+    """
+    Returns (recipient_email, context) for a booking email. Works from
+    prefetched passengers, so after prefetch_email_data() it runs no
+    queries.
+    """
+    user = booking.user if booking.user else None
+    passengers = list(booking.passengers.all())
+    first_passenger = passengers[0] if passengers else None
+
+    recipient_email = user.email if user and user.email else None
+    if not recipient_email and first_passenger:
+        recipient_email = first_passenger.email
+    if not recipient_email and fallback_recipient:
+        recipient_email = fallback_recipient
 
     customer_name = 'Valued Customer'
-    if booking.passengers.exists():
-        customer_name = booking.passengers.first().name
+    if first_passenger:
+        customer_name = first_passenger.name
     elif user and user.get_full_name():
         customer_name = user.get_full_name()
     elif user and user.username:
         customer_name = user.username
 
-    if email_type == 'pending_payment_instructions':
-        subject = (
-            f"Your Booking is Pending Payment -"
-            f"Reference: {booking.booking_reference}"
-        )
-        html_template_name = 'emails/pending_payment_email.html'
-    elif email_type == 'payment_receipt':
-        subject = f"Payment Receipt for Booking {booking.booking_reference}"
-        html_template_name = 'emails/payment_receipt_email.html'
-    elif email_type == 'booking_confirmation':
-        subject = (
-            f"Your Booking is Confirmed! Reference:"
-            f"{booking.booking_reference}"
-        )
-        html_template_name = 'emails/booking_confirmation_email.html'
-    elif email_type == 'cancellation_unpaid':
-        subject = (
-            f'Booking {booking.booking_reference} Has Been Cancelled (Unpaid)')
-        html_template_name = 'emails/cancellation_unpaid_email.html'
-        if 'reason' not in kwargs:
-            kwargs['reason'] = (
-                f'Your booking was automatically cancelled'
-                f'because payment was not received within 24 hours.'
-            )
-    elif email_type == 'cancellation':
-        subject = (
-            f'Your Booking {booking.booking_reference} Has Been Cancelled')
-        html_template_name = 'emails/cancellation_email.html'
-    elif email_type == 'refund_processing':
-        subject = f"Refund Processing for Booking {booking.booking_reference}"
-        html_template_name = 'emails/refund_processing_email.html'
-    elif email_type == 'rescheduled_confirmation':
-        subject = (
-            f"Your Booking {booking.booking_reference} Has Been Rescheduled!")
-        html_template_name = 'emails/rescheduled_confirmation_email.html'
-
-        return
-
     context = {
         'booking': booking,
         'user': user,
         'trip': booking.trip,
-        'passengers': booking.passengers.all(),
+        'passengers': passengers,
         'total_price': booking.total_price,
         'payment_status': booking.get_payment_status_display(),
         'booking_status': booking.get_status_display(),
         'customer_name': customer_name,
         **kwargs,
     }
+    return recipient_email, context
+
+
+def get_email_template(name):
+    """
+    Returns the compiled template `name`, loading and compiling it only on
+    first use in this process.
+    """
+    template = _compiled_email_templates.get(name)
+    if template is None:
+        template = _compiled_email_templates[name] = get_template(name)
+    return template
 
-    html_content = render_to_string(html_template_name, context)
 
-    plain_content = strip_tags(html_content)
+@receiver(file_changed)
+def _reset_email_templates(sender, file_path, **kwargs):
+    """Drops compiled email templates when the dev server sees an edit."""
+    if file_path.suffix in ('.html', '.txt'):
+        _compiled_email_templates.clear()
 
-    try:
-        email = EmailMultiAlternatives(
-            subject,
-            plain_content,
-            settings.DEFAULT_FROM_EMAIL,
-            [recipient_email],
+
+def render_booking_email(email_type, context):
+    """
+    Renders the subject, plain-text body and HTML body of an email type
+    from its compiled .txt and .html templates.
+    """
+    subject, template_name = EMAIL_TYPES[email_type]
+    return (
+        subject.format(reference=context['booking'].booking_reference),
+        get_email_template(f"{template_name}.txt").render(context),
+        get_email_template(f"{template_name}.html").render(context),
+    )
+
+
+def build_booking_email(booking, email_type, fallback_recipient='',
+                        **kwargs):
+    """
+    Renders a booking email and returns it as an EmailMultiAlternatives,
+    or None when there is no recipient or the email type is unknown.
+    """
+    if email_type not in EMAIL_TYPES:
+        return None
+    if email_type == 'cancellation_unpaid' and 'reason' not in kwargs:
+        kwargs['reason'] = (
+            f'Your booking was automatically cancelled'
+            f'because payment was not received within 24 hours.'
         )
-        email.attach_alternative(html_content, "text/html")
-        email.send()
-    except Exception as e:
-        logger.error(
-            f"Failed to send email '{email_type}' for booking"
-            f"{booking.booking_reference} to {recipient_email}: {e}"),
-        exc_info = True
+
+    recipient_email, context = build_email_context(
+        booking, fallback_recipient, **kwargs)
+    if not recipient_email:
+        return None
+
+    subject, plain_content, html_content = render_booking_email(
+        email_type, context)
+
+    email = EmailMultiAlternatives(
+        subject,
+        plain_content,
+        settings.DEFAULT_FROM_EMAIL,
+        [recipient_email],
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
 
 
 def _get_booking_policy():
@@ -132,20 +250,13 @@ def _get_payment_method_context(trip_or_booking):
     booking_policy = _get_booking_policy()
 
     if isinstance(trip_or_booking, Trip):
-        trip_date = trip_or_booking.date
-        departure_time = trip_or_booking.departure_time
+        trip = trip_or_booking
     elif isinstance(trip_or_booking, Booking):
-        trip_date = trip_or_booking.trip.date
-        departure_time = trip_or_booking.trip.departure_time
+        trip = trip_or_booking.trip
     else:
         raise ValueError("Invalid object type for _get_payment_method_context")
 
-    trip_datetime_naive = datetime.combine(trip_date, departure_time)
-    trip_datetime_aware = timezone.make_aware(
-        trip_datetime_naive,
-        timezone.get_current_timezone()
-        )
-    time_until_departure = trip_datetime_aware - timezone.now()
+    time_until_departure = trip.departure_at - timezone.now()
 
     offline_payment_cutoff_hours =\
         booking_policy.offline_payment_cutoff_hours_before_departure
@@ -201,6 +312,51 @@ def _get_initial_billing_details(request, booking=None):
     return {}
 
 
+def _get_payable_booking(request, booking_id):
+    """
+    Returns the booking if the current user, or the anonymous session that
+    created it, may pay for it; None for an anonymous session that did not
+    create it. Raises Http404 for an unknown booking or another user's.
+    """
+    from django.shortcuts import get_object_or_404
+    from .models import Booking
+    if request.user.is_authenticated:
+        return get_object_or_404(Booking, id=booking_id, user=request.user)
+    session_booking_id = request.session.get('anonymous_booking_id')
+    if session_booking_id and str(session_booking_id) == str(booking_id):
+        return get_object_or_404(Booking, id=booking_id)
+    return None
+
+
+def _finish_anonymous_checkout(request):
+    """
+    Ends an anonymous session's checkout. The booking can no longer be
+    paid from this session, but stays viewable on its success and
+    payment status pages.
+    """
+    booking_id = request.session.pop('anonymous_booking_id', None)
+    if booking_id is not None:
+        completed = request.session.get('completed_booking_ids', [])
+        request.session['completed_booking_ids'] = (
+            completed + [booking_id])[-10:]
+
+
+def _get_viewable_booking(request, booking_id):
+    """
+    Returns the booking if it belongs to the current user, or to the
+    anonymous session that is paying or has paid for it; None otherwise.
+    """
+    from .models import Booking
+    if request.user.is_authenticated:
+        return Booking.objects.filter(
+            pk=booking_id, user=request.user).first()
+    session_ids = [request.session.get('anonymous_booking_id')] + \
+        request.session.get('completed_booking_ids', [])
+    if str(booking_id) not in {str(pk) for pk in session_ids if pk}:
+        return None
+    return Booking.objects.filter(pk=booking_id).first()
+
+
 def _get_pending_booking(request):
     """
     Helper function to check for an existing pending booking.
@@ -213,8 +369,7 @@ def _get_pending_booking(request):
     pending_booking = None
     if request.user.is_authenticated:
         pending_booking = Booking.objects.filter(
-            Q(trip__date__gt=now.date()) |
-            Q(trip__date=now.date(), trip__departure_time__gte=now.time()),
+            trip__departure_at__gte=now,
             user=request.user,
             status='PENDING_PAYMENT',
             payment_method_type__isnull=True
@@ -223,8 +378,7 @@ def _get_pending_booking(request):
         try:
             booking_id = request.session['anonymous_booking_id']
             pending_booking = Booking.objects.get(
-                Q(trip__date__gt=now.date()) |
-                Q(trip__date=now.date(), trip__departure_time__gte=now.time()),
+                trip__departure_at__gte=now,
                 id=booking_id,
                 status='PENDING_PAYMENT',
                 payment_method_type__isnull=True
@@ -233,3 +387,117 @@ def _get_pending_booking(request):
             del request.session['anonymous_booking_id']
 
     return pending_booking
+
+
+def _is_awaiting_card_confirmation(booking):
+    """
+    Returns True when a card payment was submitted for the booking and the
+    Stripe webhook has not confirmed or failed it yet.
+    """
+    return (
+        booking.status == 'PENDING_PAYMENT' and
+        booking.payment_method_type == 'CARD' and
+        booking.payment_status == 'PENDING' and
+        bool(booking.stripe_payment_intent_id)
+    )
+
+
+def _sync_overdue_card_payment(booking):
+    """
+    Fallback for a missing webhook: once a booking has waited longer than
+    STRIPE_WEBHOOK_GRACE_SECONDS, looks its PaymentIntent up at most every
+    PAYMENT_SYNC_INTERVAL seconds and applies the result the same way the
+    webhook would. No transaction is open during the Stripe call.
+    """
+    from django.core.cache import cache
+    from .webhook_handler import confirm_paid_booking, mark_payment_failed
+    import stripe
+
+    waiting_since = cache.get_or_set(
+        f'booking:card_wait:{booking.pk}', time.time(), timeout=3600)
+    if time.time() - waiting_since < settings.STRIPE_WEBHOOK_GRACE_SECONDS:
+        return booking
+    if not cache.add(
+            f'booking:card_sync:{booking.pk}', True,
+            timeout=settings.PAYMENT_SYNC_INTERVAL):
+        return booking
+
+    try:
+        intent = stripe_gateway.retrieve_payment_intent(
+            booking.stripe_payment_intent_id)
+    except stripe.error.StripeError as e:
+        logger.warning(
+            "Could not sync PaymentIntent for booking %s: %s",
+            booking.booking_reference, e)
+        return booking
+
+    if intent.status == 'succeeded':
+        confirm_paid_booking(intent)
+    elif intent.status in ('requires_payment_method', 'canceled'):
+        mark_payment_failed(intent)
+    booking.refresh_from_db()
+    return booking
+
+
+def _payment_intent_cache_key(booking):
+    return f'booking:payment_intent:{booking.pk}'
+
+
+def _get_payment_intent_for_booking(booking, user=None):
+    """
+    Returns the id and client secret of a usable PaymentIntent for the
+    booking, creating one only when needed.
+
+    The intent's state is cached for PAYMENT_INTENT_CACHE_TIMEOUT seconds,
+    so page refreshes and payment method toggles are answered locally. A
+    stored intent is reused while it can still be paid and its amount
+    matches the booking; otherwise a new one replaces it. Raises
+    stripe.error.StripeError when Stripe cannot be reached.
+    """
+    import stripe
+    from django.core.cache import cache
+
+    amount = round(booking.total_price * 100)
+    cache_key = _payment_intent_cache_key(booking)
+    cached = cache.get(cache_key)
+    if cached and cached['id'] == booking.stripe_payment_intent_id and \
+            cached['amount'] == amount:
+        return cached
+
+    intent = None
+    if booking.stripe_payment_intent_id:
+        try:
+            intent = stripe_gateway.retrieve_payment_intent(
+                booking.stripe_payment_intent_id)
+            if intent.status in ['succeeded', 'canceled'] or \
+                    intent.amount != amount:
+                intent = None
+        except stripe.error.InvalidRequestError:
+            intent = None
+
+    if not intent:
+        # Keyed on the intent being replaced, so concurrent requests for
+        # the same booking share one new intent.
+        intent = stripe_gateway.create_payment_intent(
+            amount=amount,
+            currency=settings.STRIPE_CURRENCY,
+            metadata={
+                'booking_id': str(booking.id),
+                'booking_reference': booking.booking_reference,
+                'user_id': str(user.id) if user else 'anonymous',
+            },
+            idempotency_key=(
+                f"booking-{booking.pk}-intent-"
+                f"{booking.stripe_payment_intent_id or 'new'}-{amount}"),
+        )
+        booking.stripe_payment_intent_id = intent.id
+        booking.save(update_fields=['stripe_payment_intent_id'])
+
+    state = {
+        'id': intent.id,
+        'client_secret': intent.client_secret,
+        'amount': amount,
+    }
+    cache.set(
+        cache_key, state, timeout=settings.PAYMENT_INTENT_CACHE_TIMEOUT)
+    return state
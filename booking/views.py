@@ -1,16 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.conf import settings
 from django.db import transaction
 
 from trips.models import Trip
+from trips.inventory import SeatsUnavailable
 from my_account.models import UserProfile
-from .models import Booking, Passenger
+from .models import Booking
 from .forms import BookingConfirmationForm, BillingDetailsForm
+from .checkout import place_booking
+from .holds import convert_seat_hold, maybe_release_expired_seat_holds
+from .idempotency import idempotent_post, new_idempotency_key
+from .stats_cache import booking_stats_changed
 from .utils import (send_booking_email,
+                    _finish_anonymous_checkout,
                     _get_initial_billing_details,
                     _get_pending_booking,
-                    _get_payment_method_context
+                    _get_payment_method_context,
+                    _get_payable_booking,
+                    _get_payment_intent_for_booking,
+                    _get_viewable_booking,
+                    _is_awaiting_card_confirmation,
+                    _sync_overdue_card_payment
                     )
 
 from datetime import timedelta
@@ -18,8 +31,11 @@ from decimal import Decimal
 import stripe
 
 
+@idempotent_post('book_trip')
 def book_trip(request, trip_id, number_of_passengers):
 
+    maybe_release_expired_seat_holds()
+
     # --- PENDING BOOKING CHECK ---
     existing_pending_booking = _get_pending_booking(request)
 
@@ -75,69 +91,42 @@ def book_trip(request, trip_id, number_of_passengers):
             selected_payment_method_on_form =\
                 request.POST.get('payment_method_type')
 
-            with transaction.atomic():
-                user = request.user if request.user.is_authenticated else None
-                booking = Booking.objects.create(
-                    user=user,
-                    trip=trip,
-                    number_of_passengers=num_passengers,
-                    total_price=total_price,
-                    status='PENDING_PAYMENT',
-                    payment_status='PENDING',
+            user = request.user if request.user.is_authenticated else None
+            try:
+                booking = place_booking(
+                    form, trip, user, total_price,
                     payment_method_type=selected_payment_method_on_form,
-                )
+                    )
+            except SeatsUnavailable:
+                messages.error(
+                    request,
+                    f"Sorry, this trip no longer has {num_passengers} "
+                    f"seats available."
+                    )
+                return redirect('trips')
 
-                for i in range(num_passengers):
-                    passenger_data = {
-                        'name': form.cleaned_data[f'passenger_name{i+1}'],
-                        'age': form.cleaned_data.get(f'passenger_age{i+1}'),
-                        'contact_number':
-                            form.cleaned_data.get(
-                                f'passenger_contact_number{i+1}'
-                            ),
-                        'email': form.cleaned_data.get(f'passenger_email{i+1}')
-                    }
-                    Passenger.objects.create(booking=booking, **passenger_data)
-
-                trip.available_seats -= num_passengers
-                trip.save()
-
-                if request.user.is_authenticated and\
-                        form.cleaned_data.get('save_info'):
-                    user_profile, created = UserProfile.objects.get_or_create(
-                        user=request.user
-                        )
-                    user_profile.default_name = form.cleaned_data.get(
-                        'passenger_name1'
-                        )
-                    user_profile.default_phone_number = form.cleaned_data.get(
-                        'passenger_contact_number1'
-                        )
-                    user_profile.default_email = form.cleaned_data.get(
-                        'passenger_email1'
-                        )
-                    user_profile.save()
-                    messages.info(
-                        request,
-                        f"First passenger details saved to your profile"
-                        f"for future bookings!"
-                        )
+            if user and form.cleaned_data.get('save_info'):
+                messages.info(
+                    request,
+                    f"First passenger details saved to your profile"
+                    f"for future bookings!"
+                    )
 
-                if not request.user.is_authenticated:
-                    request.session['anonymous_booking_id'] = booking.id
-                    messages.success(
-                        request,
-                        f"Your guest booking {booking.booking_reference}"
-                        f"created! Please proceed to payment."
-                        )
-                else:
-                    messages.success(
-                        request,
-                        f"Booking {booking.booking_reference}"
-                        f"created! Please proceed to payment."
-                        )
+            if not request.user.is_authenticated:
+                request.session['anonymous_booking_id'] = booking.id
+                messages.success(
+                    request,
+                    f"Your guest booking {booking.booking_reference}"
+                    f"created! Please proceed to payment."
+                    )
+            else:
+                messages.success(
+                    request,
+                    f"Booking {booking.booking_reference}"
+                    f"created! Please proceed to payment."
+                    )
 
-                return redirect('process_payment', booking_id=booking.id)
+            return redirect('process_payment', booking_id=booking.id)
         else:
             messages.error(request, "Please correct the errors below.")
             context = {
@@ -147,6 +136,7 @@ def book_trip(request, trip_id, number_of_passengers):
                 'passenger_range': passenger_range,
                 'total_price': total_price,
                 'stripe_public_key': settings.STRIPE_PUBLIC_KEY,
+                'idempotency_key': new_idempotency_key(),
                 **payment_context,
             }
             return render(request, 'booking/booking_form.html', context)
@@ -183,26 +173,22 @@ def book_trip(request, trip_id, number_of_passengers):
             'passenger_range': passenger_range,
             'total_price': total_price,
             'stripe_public_key': settings.STRIPE_PUBLIC_KEY,
+            'idempotency_key': new_idempotency_key(),
             **payment_context,
         }
         return render(request, template, context)
 
 
+@idempotent_post('process_payment')
 def process_payment(request, booking_id):
-    booking = None
-    if request.user.is_authenticated:
-        booking = get_object_or_404(Booking, id=booking_id, user=request.user)
-    else:
-        session_booking_id = request.session.get('anonymous_booking_id')
-        if session_booking_id and str(session_booking_id) == str(booking_id):
-            booking = get_object_or_404(Booking, id=booking_id)
-        else:
-            messages.error(
-                request,
-                f"Access to this booking is unauthorized or your session has"
-                f"expired. Please start a new booking."
-                )
-            return redirect('trips')
+    booking = _get_payable_booking(request, booking_id)
+    if booking is None and not request.user.is_authenticated:
+        messages.error(
+            request,
+            f"Access to this booking is unauthorized or your session has"
+            f"expired. Please start a new booking."
+            )
+        return redirect('trips')
 
     if not booking:
         messages.error(request, "Booking not found or not accessible.")
@@ -223,8 +209,6 @@ def process_payment(request, booking_id):
         return redirect('manage_booking:booking_detail', booking_id=booking.id)
 
     stripe_public_key = settings.STRIPE_PUBLIC_KEY
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    stripe_total = round(booking.total_price * 100)
 
     payment_context = _get_payment_method_context(booking)
 
@@ -238,56 +222,10 @@ def process_payment(request, booking_id):
             first_passenger.contact_number if first_passenger.contact_number\
             else ''
 
-    intent = None
     billing_form = None
     user_profile = None
 
     if request.method == 'GET':
-        try:
-            if booking.stripe_payment_intent_id:
-                try:
-                    intent = stripe.PaymentIntent.retrieve(
-                        booking.stripe_payment_intent_id)
-                    if intent.status in ['succeeded', 'canceled']:
-                        intent = None
-                except stripe.error.InvalidRequestError:
-                    intent = None
-
-            if not intent:
-                intent = stripe.PaymentIntent.create(
-                    amount=stripe_total,
-                    currency=settings.STRIPE_CURRENCY,
-                    metadata={
-                        'booking_id': str(booking.id),
-                        'booking_reference': booking.booking_reference,
-                        'user_id': str(
-                            request.user.id
-                        ) if request.user.is_authenticated
-                        else 'anonymous',
-                    }
-                )
-                booking.stripe_payment_intent_id = intent.id
-                booking.save(update_fields=['stripe_payment_intent_id'])
-
-        except stripe.error.StripeError as e:
-            messages.error(
-                request,
-                f"Error preparing payment: {e}. Please try again."
-                )
-            return redirect(
-                'manage_booking:booking_detail',
-                booking_id=booking.id
-                )
-        except Exception as e:
-            messages.error(
-                request,
-                f"An unexpected error occurred: {e}. Please try again."
-                )
-            return redirect(
-                'manage_booking:booking_detail',
-                booking_id=booking.id
-                )
-
         # Initialize billing form for GET request
         billing_form = BillingDetailsForm(
             initial=_get_initial_billing_details(request, booking),
@@ -359,7 +297,8 @@ def process_payment(request, booking_id):
         billing_form_is_valid = billing_form.is_valid()
 
         if selected_payment_method == 'CARD':
-            if not payment_intent_id:
+            if not payment_intent_id or \
+                    payment_intent_id != booking.stripe_payment_intent_id:
                 messages.error(
                     request,
                     f"Card payment selected, but Payment Intent ID was not"
@@ -369,116 +308,52 @@ def process_payment(request, booking_id):
                 booking.save()
                 return redirect('process_payment', booking_id=booking.id)
 
-            try:
-                stripe_intent = stripe.PaymentIntent.retrieve(
-                    payment_intent_id)
-
-                if stripe_intent.status == 'succeeded':
-                    with transaction.atomic():
-                        booking.payment_status = 'PAID'
-                        booking.status = 'CONFIRMED'
-                        booking.stripe_payment_intent_id = stripe_intent.id
-                        booking.payment_method_type = 'CARD'
-
-                        if stripe_intent.payment_method:
-                            pm = stripe.PaymentMethod.retrieve(
-                                stripe_intent.payment_method)
-                            if pm.type == 'card':
-                                booking.card_brand = pm.card.brand
-                                booking.card_last4 = pm.card.last4
-                            booking.stripe_payment_method_id = pm.id
-
-                        booking.save()
-
-                        if request.user.is_authenticated and save_info:
-                            try:
-                                user_profile, created = \
-                                    UserProfile.objects.get_or_create(
-                                        user=request.user)
-                                if billing_form_is_valid:
-                                    user_profile.default_name = \
-                                        billing_form.cleaned_data[
-                                            'billing_name']
-                                    user_profile.default_email = \
-                                        billing_form.cleaned_data[
-                                            'billing_email']
-                                    user_profile.default_phone_number = \
-                                        billing_form.cleaned_data[
-                                            'billing_phone']
-                                    user_profile.default_street_address1 = \
-                                        billing_form.cleaned_data[
-                                            'billing_street_address1']
-                                    user_profile.default_street_address2 = \
-                                        billing_form.cleaned_data[
-                                            'billing_street_address2']
-                                    user_profile.default_city = \
-                                        billing_form.cleaned_data[
-                                            'billing_city']
-                                    user_profile.default_postcode = \
-                                        billing_form.cleaned_data[
-                                            'billing_postcode']
-                                    user_profile.default_country = \
-                                        billing_form.cleaned_data[
-                                            'billing_country']
-                                    user_profile.save()
-                                    messages.info(
-                                        request,
-                                        f"Billing details saved to"
-                                        f"your profile."
-                                        )
-                                else:
-                                    messages.warning(
-                                        request,
-                                        f"Could not save billing details to"
-                                        f"profile due to invalid data."
-                                        )
-                            except Exception as e:
-                                messages.error(
-                                    request,
-                                    f"Error saving billing details"
-                                    f"to profile: {e}"
-                                    )
-
-                        if not request.user.is_authenticated \
-                                and 'anonymous_booking_id' in request.session:
-                            del request.session['anonymous_booking_id']
-
-                        messages.success(
-                            request,
-                            f"Payment successful! Booking"
-                            f"{booking.booking_reference} is now confirmed."
-                            )
-                        send_booking_email(
-                            booking,
-                            email_type='booking_confirmation'
-                            )
-                        return redirect(
-                            'booking_success',
-                            booking_id=booking.id
-                            )
-
+            # The payment is confirmed by the Stripe webhook; this request
+            # only records the customer's details and never calls Stripe.
+            updated = Booking.objects.filter(
+                pk=booking.pk, status='PENDING_PAYMENT'
+            ).exclude(payment_status='PAID').update(
+                payment_method_type='CARD',
+                payment_status='PENDING',
+                )
+            if updated:
+                booking_stats_changed([booking.pk])
+
+            if request.user.is_authenticated and save_info:
+                if billing_form_is_valid:
+                    UserProfile.objects.filter(user=request.user).update(
+                        default_name=billing_form.cleaned_data[
+                            'billing_name'],
+                        default_email=billing_form.cleaned_data[
+                            'billing_email'],
+                        default_phone_number=billing_form.cleaned_data[
+                            'billing_phone'],
+                        default_street_address1=billing_form.cleaned_data[
+                            'billing_street_address1'],
+                        default_street_address2=billing_form.cleaned_data[
+                            'billing_street_address2'],
+                        default_city=billing_form.cleaned_data[
+                            'billing_city'],
+                        default_postcode=billing_form.cleaned_data[
+                            'billing_postcode'],
+                        default_country=billing_form.cleaned_data[
+                            'billing_country'],
+                        )
+                    messages.info(
+                        request,
+                        "Billing details saved to your profile."
+                        )
                 else:
-                    messages.error(
+                    messages.warning(
                         request,
-                        f"Card payment status: {stripe_intent.status}."
-                        f"Please try again or use another method."
+                        f"Could not save billing details to"
+                        f"profile due to invalid data."
                         )
-                    booking.payment_status = 'FAILED'
-                    booking.save()
-            except stripe.error.StripeError as e:
-                messages.error(
-                    request,
-                    f"A Stripe error occurred: {e}. Please try again."
-                    )
-                booking.payment_status = 'FAILED'
-                booking.save()
-            except Exception as e:
-                messages.error(
-                    request,
-                    f"An unexpected error occurred: {e}. Please try again."
-                    )
-                booking.payment_status = 'FAILED'
-                booking.save()
+
+            if not request.user.is_authenticated:
+                _finish_anonymous_checkout(request)
+
+            return redirect('booking_success', booking_id=booking.id)
 
         elif selected_payment_method in ['CASH', 'GCASH']:
             if payment_context['is_offline_payment_disallowed']:
@@ -490,15 +365,15 @@ def process_payment(request, booking_id):
                     )
             else:
                 with transaction.atomic():
+                    convert_seat_hold(booking)
                     booking.status = 'PENDING_PAYMENT'
                     booking.payment_status = 'PENDING'
                     booking.payment_method_type = selected_payment_method
                     booking.stripe_payment_intent_id = None
                     booking.save()
 
-                if not request.user.is_authenticated \
-                        and 'anonymous_booking_id' in request.session:
-                    del request.session['anonymous_booking_id']
+                if not request.user.is_authenticated:
+                    _finish_anonymous_checkout(request)
 
                 messages.info(
                     request,
@@ -525,20 +400,50 @@ def process_payment(request, booking_id):
         'total_price': booking.total_price,
         'num_passengers': booking.number_of_passengers,
         'stripe_public_key': stripe_public_key,
-        'client_secret': intent.client_secret if intent else None,
         'num_passsengers': booking.number_of_passengers,
         'first_passenger_email': first_passenger_email,
         'first_passenger_contact_number': first_passenger_contact_number,
         'billing_form': billing_form,
         'user_profile': user_profile
         if request.user.is_authenticated else None,
+        'idempotency_key': new_idempotency_key(),
         **payment_context,
     }
     return render(request, template, context)
 
 
+@require_POST
+def create_payment_intent(request, booking_id):
+    """
+    Returns the client secret of the booking's PaymentIntent as JSON.
+    Called by the payment page only once the card method is chosen, so
+    cash and GCash payments never create an intent.
+    """
+    booking = _get_payable_booking(request, booking_id)
+    if booking is None:
+        return JsonResponse({'error': 'Booking not accessible.'}, status=403)
+    if booking.status != 'PENDING_PAYMENT' or \
+            booking.payment_status == 'PAID':
+        return JsonResponse(
+            {'error': 'This booking can no longer be paid.'}, status=409)
+
+    user = request.user if request.user.is_authenticated else None
+    try:
+        intent = _get_payment_intent_for_booking(booking, user)
+    except stripe.error.StripeError as e:
+        return JsonResponse(
+            {'error': f"Error preparing payment: {e}"}, status=502)
+
+    return JsonResponse({
+        'client_secret': intent['client_secret'],
+        'payment_intent_id': intent['id'],
+    })
+
+
 def booking_success(request, booking_id):
-    booking = get_object_or_404(Booking, pk=booking_id)
+    booking = _get_viewable_booking(request, booking_id)
+    if booking is None:
+        raise Http404("Booking not found or not accessible.")
     passengers = booking.passengers.all()
 
     booking_expiry_date = None
@@ -557,5 +462,26 @@ def booking_success(request, booking_id):
 
     if booking.payment_status == 'PAID' and booking.status == 'CONFIRMED':
         return render(request, 'booking/booking_success.html', context)
+    elif _is_awaiting_card_confirmation(booking):
+        return render(request, 'booking/payment_processing.html', context)
     else:
         return render(request, 'booking/booking_pending.html', context)
+
+
+def booking_payment_status(request, booking_id):
+    """
+    Returns the booking's payment state as JSON for the payment processing
+    page to poll. Reads local state only, except for one throttled
+    PaymentIntent lookup when the Stripe webhook is overdue.
+    """
+    booking = _get_viewable_booking(request, booking_id)
+    if booking is None:
+        return JsonResponse({'error': 'Booking not accessible.'}, status=403)
+    if _is_awaiting_card_confirmation(booking):
+        booking = _sync_overdue_card_payment(booking)
+
+    return JsonResponse({
+        'status': booking.status,
+        'payment_status': booking.payment_status,
+        'is_confirmed': booking.status == 'CONFIRMED',
+    })
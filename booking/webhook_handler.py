@@ -0,0 +1,231 @@
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from decimal import Decimal
+
+from bkoda import stripe_gateway
+from trips.inventory import SeatsUnavailable
+from .models import Booking
+from .holds import convert_seat_hold
+from .stats_cache import booking_stats_changed
+from .utils import send_booking_email
+
+import logging
+import stripe
+
+logger = logging.getLogger(__name__)
+
+
+def _bookings_for_intent(intent_id, booking_id=None):
+    """
+    Returns the bookings paid for by a PaymentIntent, matched on the stored
+    intent id or the booking id the intent was created with.
+    """
+    match = Q(stripe_payment_intent_id=intent_id)
+    if booking_id and str(booking_id).isdigit():
+        match |= Q(pk=int(booking_id))
+    return Booking.objects.filter(match)
+
+
+def _mark_paid(booking, intent):
+    booking.payment_status = 'PAID'
+    booking.stripe_payment_intent_id = intent['id']
+    booking.payment_method_type = 'CARD'
+    payment_method = intent.get('payment_method')
+    if isinstance(payment_method, str):
+        booking.stripe_payment_method_id = payment_method
+
+
+def _rescue_canceled_booking(booking, intent):
+    """
+    Handles a payment that succeeded after its booking was cancelled.
+
+    A booking cancelled automatically for non-payment (payment FAILED) is
+    confirmed again if its seats can still be reserved. Otherwise, or when
+    the customer cancelled it, the payment is recorded with a PENDING
+    refund of the full amount, which the caller then issues. Returns True
+    when a refund is needed.
+    """
+    if booking.payment_status == 'FAILED':
+        try:
+            with transaction.atomic():
+                _mark_paid(booking, intent)
+                booking.status = 'CONFIRMED'
+                booking.save()
+            logger.warning(
+                "PaymentIntent %s succeeded for canceled booking %s; "
+                "seats were still free and the booking is confirmed.",
+                intent['id'], booking.booking_reference)
+            return False
+        except SeatsUnavailable:
+            booking.status = 'CANCELED'
+
+    refund_amount = Decimal(intent.get('amount') or 0) / 100
+    _mark_paid(booking, intent)
+    booking.refund_status = 'PENDING'
+    booking.refund_amount = refund_amount
+    booking.save()
+    send_booking_email(
+        booking, 'refund_processing', refund_amount=refund_amount)
+    logger.error(
+        "PaymentIntent %s succeeded for canceled booking %s; refunding "
+        "Php%s.", intent['id'], booking.booking_reference, refund_amount)
+    return True
+
+
+def _refund_unseated_payment(booking, intent):
+    """
+    Refunds a payment for a booking that could not be given its seats.
+    charge.refunded completes the booking's refund; if Stripe cannot be
+    reached, the refund stays PENDING for staff to process.
+    """
+    try:
+        stripe_gateway.create_refund(
+            payment_intent=intent['id'],
+            metadata={
+                'booking_id': str(booking.pk),
+                'reason': 'booking_canceled_before_payment',
+            },
+            idempotency_key=f"booking-{booking.pk}-refund-{intent['id']}",
+        )
+    except stripe.error.StripeError as e:
+        logger.error(
+            "Could not refund PaymentIntent %s for canceled booking %s; "
+            "the refund is left pending for staff: %s",
+            intent['id'], booking.booking_reference, e)
+
+
+def confirm_paid_booking(intent):
+    """
+    Confirms the booking paid for by a succeeded PaymentIntent.
+
+    Runs in its own short transaction with the booking row locked, so a
+    webhook delivered twice, or racing the status poll, confirms it only
+    once. A payment for a booking cancelled in the meantime re-reserves
+    its seats, or is refunded (see _rescue_canceled_booking). Returns the
+    booking, or None when no booking matches.
+    """
+    metadata = intent.get('metadata') or {}
+    needs_refund = False
+
+    with transaction.atomic():
+        booking = _bookings_for_intent(
+            intent['id'], metadata.get('booking_id')
+        ).select_for_update().first()
+        if booking is None:
+            return None
+        if booking.payment_status == 'PAID' and \
+                booking.status != 'PENDING_PAYMENT':
+            return booking
+        if booking.status == 'CANCELED':
+            needs_refund = _rescue_canceled_booking(booking, intent)
+        else:
+            convert_seat_hold(booking)
+            _mark_paid(booking, intent)
+            booking.status = 'CONFIRMED'
+            booking.save()
+
+    # The Stripe call is made only once the row lock is released.
+    if needs_refund:
+        _refund_unseated_payment(booking, intent)
+    return booking
+
+
+def mark_payment_failed(intent):
+    """
+    Flags an unpaid booking whose PaymentIntent failed, leaving it pending
+    so the customer can retry while the seat hold lasts.
+    """
+    metadata = intent.get('metadata') or {}
+    bookings = _bookings_for_intent(intent['id'], metadata.get('booking_id'))
+    updated = bookings.exclude(payment_status='PAID').update(
+        payment_status='FAILED')
+    if updated:
+        booking_stats_changed(bookings.values('pk'))
+    return updated
+
+
+class StripeWH_Handler:
+    """
+    Handles Stripe webhooks. Every handler can be replayed safely: Stripe
+    retries deliveries, and the status poll may already have applied the
+    same change.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def handle_event(self, event):
+        """
+        Handles a generic, unknown or unexpected webhook event.
+        """
+        return HttpResponse(
+            content=f"Unhandled webhook received: {event['type']}",
+            status=200)
+
+    def handle_payment_intent_succeeded(self, event):
+        """
+        Handles the payment_intent.succeeded webhook from Stripe.
+        """
+        intent = event['data']['object']
+        booking = confirm_paid_booking(intent)
+        if booking is None:
+            return HttpResponse(
+                content=f"Webhook received: {event['type']} | "
+                        f"ERROR: no booking for {intent['id']}",
+                status=200)
+        return HttpResponse(
+            content=f"Webhook received: {event['type']} | "
+                    f"SUCCESS: booking {booking.booking_reference} confirmed",
+            status=200)
+
+    def handle_payment_intent_payment_failed(self, event):
+        """
+        Handles the payment_intent.payment_failed webhook from Stripe.
+        """
+        mark_payment_failed(event['data']['object'])
+        return HttpResponse(
+            content=f"Webhook received: {event['type']}",
+            status=200)
+
+    def handle_charge_succeeded(self, event):
+        """
+        Handles the charge.succeeded webhook from Stripe by recording the
+        card brand and last four digits, which Stripe sends with the
+        charge, so confirming a booking needs no PaymentMethod lookup.
+        """
+        charge = event['data']['object']
+        details = charge.get('payment_method_details') or {}
+        card = details.get('card') or {}
+        if charge.get('payment_intent') and card:
+            Booking.objects.filter(
+                stripe_payment_intent_id=charge['payment_intent']
+            ).update(
+                card_brand=card.get('brand'),
+                card_last4=card.get('last4'),
+            )
+        return HttpResponse(
+            content=f"Webhook received: {event['type']}",
+            status=200)
+
+    def handle_charge_refunded(self, event):
+        """
+        Handles the charge.refunded webhook from Stripe.
+        """
+        charge = event['data']['object']
+        refund_amount = Decimal(charge.get('amount_refunded') or 0) / 100
+        updates = {
+            'refund_amount': refund_amount,
+            'refund_status': 'COMPLETED',
+        }
+        if charge.get('refunded'):
+            updates['payment_status'] = 'REFUNDED'
+        if charge.get('payment_intent'):
+            bookings = Booking.objects.filter(
+                stripe_payment_intent_id=charge['payment_intent'])
+            updated = bookings.update(**updates)
+            if updated:
+                booking_stats_changed(bookings.values('pk'))
+        return HttpResponse(
+            content=f"Webhook received: {event['type']}",
+            status=200)
@@ -1,6 +1,7 @@
 from django.shortcuts import render
 from trips.models import Trip
 from trips.forms import TripSearchForm
+from trips.utils import match_route_ids
 from datetime import datetime, date, timedelta
 
 
@@ -18,8 +19,6 @@ def index(request):
     else:
         form = TripSearchForm(initial=default_initial_data)
 
-    trips = Trip.objects.all()
-
     current_date = date.today()
     selected_origin = default_initial_data['origin']
     selected_destination = default_initial_data['destination']
@@ -31,22 +30,15 @@ def index(request):
         current_date = form.cleaned_data.get('departure_date') or date.today()
         selected_travelers = form.cleaned_data.get('num_travelers') or 1
 
-        if selected_origin:
-            trips = trips.filter(origin__icontains=selected_origin)
-        if selected_destination:
-            trips = trips.filter(destination__icontains=selected_destination)
-        if current_date:
-            trips = trips.filter(departure_date=current_date)
-
-        trips = [
-            trip for trip in trips if trip.available_seats >=
-            selected_travelers]
+    trips = Trip.objects.filter(
+        route_id__in=match_route_ids(selected_origin, selected_destination),
+        date=current_date,
+        available_seats__gte=selected_travelers
+    ).order_by('departure_time')
 
     prev_date = current_date - timedelta(days=1)
     next_date = current_date + timedelta(days=1)
 
-    trips = sorted(trips, key=lambda trip: trip.departure_time)
-
     context = {
         'form': form,
         'trips': trips,
@@ -0,0 +1,212 @@
+"""
+Keyset (cursor) pagination for booking and trip lists.
+
+Pages are fetched with `WHERE (key) > (boundary key) ... LIMIT n + 1`
+instead of OFFSET, so a deep page costs the same as the first and paging
+needs no COUNT(*). The key is the list's ordering, ending in a unique
+field, e.g. ('-booking_date', '-pk') or ('date', 'departure_time', 'pk').
+Next/previous cursors are signed, opaque tokens holding the key of the
+boundary row, the direction and the position of the page, so tampered or
+stale tokens simply fall back to the first page.
+"""
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'manage_booking.pagination'
+
+
+def approximate_count(queryset):
+    """
+    Returns the planner's row estimate for an unfiltered queryset on
+    PostgreSQL, where COUNT(*) means a full scan, and an exact count
+    otherwise.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 means the table has never been analyzed.
+        if row and row[0] >= 0:
+            return row[0]
+    return queryset.count()
+
+
+def _resolve_field(model, path):
+    field = None
+    for name in path.split('__'):
+        if name == 'pk':
+            field = model._meta.pk
+        else:
+            field = model._meta.get_field(name)
+        model = field.related_model or model
+    return field
+
+
+def _key_value(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _serialize(value):
+    """Makes a key value JSON serializable; to_python() reverses it."""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+def _keyset_filter(fields, values, forward):
+    """
+    Returns the Q matching rows after (forward) or before the boundary
+    key `values` in the order given by `fields`.
+    """
+    condition = Q()
+    for i, (name, descending) in enumerate(fields):
+        lookup = 'lt' if descending == forward else 'gt'
+        equal = {prev_name: values[j]
+                 for j, (prev_name, _) in enumerate(fields[:i])}
+        condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+    return condition
+
+
+class CursorPage:
+    """
+    One page of a keyset-paginated list. Quacks like Django's Page for
+    iteration, has_next/has_previous and start_index/end_index; links are
+    built from next_query/previous_query, which keep the other GET
+    parameters (such as list filters).
+    """
+
+    def __init__(self, object_list, start_index, has_next, has_previous,
+                 next_cursor, previous_cursor, query_dict, param,
+                 count_function):
+        self.object_list = object_list
+        self._start_index = start_index
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._query_dict = query_dict
+        self._param = param
+        self._count_function = count_function
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def start_index(self):
+        return self._start_index if self.object_list else 0
+
+    def end_index(self):
+        return self._start_index + len(self.object_list) - 1 \
+            if self.object_list else 0
+
+    @cached_property
+    def count(self):
+        """Total number of rows, exact or approximate; computed on use."""
+        return self._count_function()
+
+    def _query(self, cursor):
+        query_dict = self._query_dict.copy()
+        query_dict[self._param] = cursor
+        return f"?{query_dict.urlencode()}"
+
+    @property
+    def next_query(self):
+        return self._query(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query(self.previous_cursor) \
+            if self.has_previous else ''
+
+
+def paginate_by_cursor(request, queryset, ordering, items_per_page=3,
+                       param='page', approximate=False):
+    """
+    Returns the CursorPage of queryset selected by the `param` GET
+    parameter. `ordering` must end with a unique field. With
+    `approximate`, the page's count may be a planner estimate.
+    """
+    fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+    model = queryset.model
+
+    cursor = {}
+    token = request.GET.get(param)
+    if token:
+        try:
+            cursor = signing.loads(token, salt=CURSOR_SALT)
+            cursor['k'] = [
+                _resolve_field(model, name).to_python(value)
+                for (name, _), value in zip(fields, cursor['k'], strict=True)
+            ]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            cursor = {}
+
+    forward = cursor.get('d', 'n') == 'n'
+    start_index = cursor.get('i', 1) if cursor else 1
+
+    page_queryset = queryset
+    if cursor:
+        page_queryset = page_queryset.filter(
+            _keyset_filter(fields, cursor['k'], forward))
+    if forward:
+        page_queryset = page_queryset.order_by(*ordering)
+    else:
+        page_queryset = page_queryset.order_by(*[
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in ordering])
+
+    items = list(page_queryset[:items_per_page + 1])
+    has_more = len(items) > items_per_page
+    items = items[:items_per_page]
+    if forward:
+        has_next, has_previous = has_more, bool(cursor)
+    else:
+        items.reverse()
+        has_next, has_previous = True, has_more
+        if not has_more:
+            start_index = 1
+
+    def make_cursor(obj, direction, index):
+        return signing.dumps({
+            'k': [_serialize(_key_value(obj, name)) for name, _ in fields],
+            'd': direction,
+            'i': index,
+        }, salt=CURSOR_SALT, compress=True)
+
+    next_cursor = previous_cursor = None
+    if items:
+        next_cursor = make_cursor(
+            items[-1], 'n', start_index + len(items))
+        previous_cursor = make_cursor(
+            items[0], 'p', max(1, start_index - items_per_page))
+
+    return CursorPage(
+        items,
+        start_index,
+        has_next,
+        has_previous,
+        next_cursor,
+        previous_cursor,
+        request.GET,
+        param,
+        (lambda: approximate_count(queryset)) if approximate
+        else queryset.count,
+    )
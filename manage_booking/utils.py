@@ -1,32 +1,28 @@
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib import messages
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
-from booking.models import Booking, BookingPolicy
+from bkoda import stripe_gateway
+from booking.models import Booking, BookingPolicy, Passenger
+from booking.search import update_search_index
 from booking.utils import send_booking_email
 from decimal import Decimal
 from datetime import datetime
+from .pagination import paginate_by_cursor
 
 import stripe
 
 
-def paginate_queryset(request, queryset, items_per_page=3):
+def paginate_queryset(request, queryset, ordering, items_per_page=3,
+                      param='page', approximate=False):
     """
-    Helper function to paginate a given queryset.
-
+    Helper function to paginate a given queryset by cursor, in the order
+    given by `ordering`, which must end with a unique field. See
+    manage_booking.pagination.
     """
-    paginator = Paginator(queryset, items_per_page)
-    page_number = request.GET.get('page')
-
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
-    return page_obj
+    return paginate_by_cursor(
+        request, queryset, ordering, items_per_page=items_per_page,
+        param=param, approximate=approximate)
 
 
 def _calculate_reschedule_financials(original_booking, new_trip, policy):
@@ -130,6 +126,8 @@ def _create_new_rescheduled_booking(
         request, original_booking, new_trip, new_booking_params):
     """
     Handles the common transactional logic for a successful reschedule.
+    Seats move from the original trip to the new one as the bookings are
+    saved.
 
     Returns a redirect response or raises an exception on failure.
     """
@@ -149,16 +147,12 @@ def _create_new_rescheduled_booking(
         **new_booking_params
     )
 
-    for passenger in original_booking.passengers.all():
+    passengers = list(original_booking.passengers.all())
+    for passenger in passengers:
         passenger.pk = None
         passenger.booking = new_booking
-        passenger.save()
-
-    original_booking.trip.available_seats += \
-        original_booking.number_of_passengers
-    original_booking.trip.save()
-    new_trip.available_seats -= num_passengers
-    new_trip.save()
+    Passenger.objects.bulk_create(passengers)
+    update_search_index([new_booking.pk])
 
     return new_booking
 
@@ -187,7 +181,7 @@ def _process_refund(request, booking, refund_amount, metadata):
         else:
             stripe_refund_amount_cents = round(refund_amount * 100)
             try:
-                refund = stripe.Refund.create(
+                refund = stripe_gateway.create_refund(
                     payment_intent=booking.stripe_payment_intent_id,
                     amount=stripe_refund_amount_cents,
                     metadata=metadata
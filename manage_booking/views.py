@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.conf import settings
 from django.db import transaction
 from django.urls import reverse
+from bkoda import stripe_gateway
 from booking.models import Booking, BookingPolicy
 from booking.forms import BillingDetailsForm
 from my_account.models import UserProfile
@@ -24,7 +25,8 @@ from .utils import (paginate_queryset,
 
 import stripe
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+# Newest trips first; the booking id breaks ties for the cursor.
+BOOKING_LIST_ORDERING = ('-trip__date', '-trip__departure_time', '-pk')
 
 
 @login_required
@@ -35,15 +37,15 @@ def all_bookings_list(request):
     all_bookings = Booking.objects.filter(
         user=request.user,
         payment_method_type__isnull=False
-    ).order_by('-trip__date', '-trip__departure_time')
+    ).select_related('trip')
 
     all_bookings_page = paginate_queryset(
-        request, all_bookings, items_per_page=3)
+        request, all_bookings, BOOKING_LIST_ORDERING, items_per_page=3)
 
     template = 'manage_booking/all_bookings_list.html'
     context = {
         'all_bookings_page': all_bookings_page,
-        'num_all_bookings': all_bookings.count(),
+        'num_all_bookings': all_bookings_page.count,
     }
     return render(request, template, context)
 
@@ -57,15 +59,15 @@ def confirmed_bookings_list(request):
         user=request.user,
         status='CONFIRMED',
         payment_status='PAID'
-    ).order_by('-trip__date', '-trip__departure_time')
+    ).select_related('trip')
 
     confirmed_bookings_page = paginate_queryset(
-        request, confirmed_bookings, items_per_page=3)
+        request, confirmed_bookings, BOOKING_LIST_ORDERING, items_per_page=3)
 
     template = 'manage_booking/confirmed_bookings.html'
     context = {
         'confirmed_bookings_page': confirmed_bookings_page,
-        'num_confirmed_bookings': confirmed_bookings.count(),
+        'num_confirmed_bookings': confirmed_bookings_page.count,
     }
     return render(request, template, context)
 
@@ -81,15 +83,16 @@ def pending_payment_list(request):
         status='PENDING_PAYMENT',
         payment_status='PENDING',
         payment_method_type__isnull=False
-    ).order_by('-trip__date', '-trip__departure_time')
+    ).select_related('trip')
 
     pending_payment_bookings_page = paginate_queryset(
-        request, pending_payment_bookings, items_per_page=3)
+        request, pending_payment_bookings, BOOKING_LIST_ORDERING,
+        items_per_page=3)
 
     template = 'manage_booking/pending_payment.html'
     context = {
         'pending_payment_bookings_page': pending_payment_bookings_page,
-        'num_pending_payment_bookings': pending_payment_bookings.count(),
+        'num_pending_payment_bookings': pending_payment_bookings_page.count,
     }
     return render(request, template, context)
 
@@ -103,24 +106,26 @@ def pending_or_refunded_bookings_list(request):
     pending_refund_bookings = Booking.objects.filter(
         user=request.user,
         refund_status='PENDING'
-    ).order_by('-trip__date', '-trip__departure_time')
+    ).select_related('trip')
 
     refunded_bookings = Booking.objects.filter(
         user=request.user,
         refund_status='COMPLETED'
-    ).order_by('-trip__date', '-trip__departure_time')
+    ).select_related('trip')
 
     pending_refund_bookings_page = paginate_queryset(
-        request, pending_refund_bookings, items_per_page=3)
+        request, pending_refund_bookings, BOOKING_LIST_ORDERING,
+        items_per_page=3, param='pending_page')
     refunded_bookings_page = paginate_queryset(
-        request, refunded_bookings, items_per_page=3)
+        request, refunded_bookings, BOOKING_LIST_ORDERING,
+        items_per_page=3, param='refunded_page')
 
     template = 'manage_booking/pending_or_refunded_bookings.html'
     context = {
         'pending_refund_bookings_page': pending_refund_bookings_page,
-        'num_pending_refund_bookings': pending_refund_bookings.count(),
+        'num_pending_refund_bookings': pending_refund_bookings_page.count,
         'refunded_bookings_page': refunded_bookings_page,
-        'num_refunded_bookings': refunded_bookings.count(),
+        'num_refunded_bookings': refunded_bookings_page.count,
     }
     return render(request, template, context)
 
@@ -134,15 +139,15 @@ def canceled_bookings_list(request):
         user=request.user,
         status='CANCELED',
         payment_method_type__isnull=False
-    ).order_by('-trip__date', '-trip__departure_time')
+    ).select_related('trip')
 
     canceled_bookings_page = paginate_queryset(
-        request, canceled_bookings, items_per_page=3)
+        request, canceled_bookings, BOOKING_LIST_ORDERING, items_per_page=3)
 
     template = 'manage_booking/canceled_bookings_list.html'
     context = {
         'canceled_bookings_page': canceled_bookings_page,
-        'num_canceled_bookings': canceled_bookings.count(),
+        'num_canceled_bookings': canceled_bookings_page.count,
     }
     return render(request, template, context)
 
@@ -355,15 +360,6 @@ def booking_cancel(request, booking_id):
                 booking.save(
                     update_fields=['status', 'refund_status', 'refund_amount'])
 
-                if booking.trip.available_seats is not None:
-                    booking.trip.available_seats += \
-                        booking.number_of_passengers
-                    booking.trip.save(update_fields=['available_seats'])
-                else:
-                    messages.warning(
-                        request,
-                        "Could not update trip available seats as it's null.")
-
                 messages.success(
                     request,
                     f"Booking {booking.booking_reference} has been"
@@ -606,7 +602,7 @@ def booking_reschedule_confirm(request, booking_id, new_trip_id):
         if amount_to_pay > 0:
             try:
                 stripe_amount = int(amount_to_pay * 100)
-                payment_intent = stripe.PaymentIntent.create(
+                payment_intent = stripe_gateway.create_payment_intent(
                     amount=stripe_amount,
                     currency="php",
                     metadata={
@@ -706,9 +702,9 @@ def booking_reschedule_confirm(request, booking_id, new_trip_id):
 
                         if payment_intent_id:
                             try:
-                                stripe.api_key = settings.STRIPE_SECRET_KEY
-                                payment_intent = stripe.PaymentIntent.retrieve(
-                                    payment_intent_id)
+                                payment_intent = \
+                                    stripe_gateway.retrieve_payment_intent(
+                                        payment_intent_id)
 
                                 if payment_intent.status == 'succeeded':
                                     expected_amount_cents = \
@@ -2,7 +2,6 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from datetime import datetime
 
 from .forms import ProfileForm
 from booking.models import Booking
@@ -54,13 +53,8 @@ def my_bookings(request):
     Displays all bookings for the logged-in user,
     categorizing them into 'upcoming confirmed' and 'other bookings'.
     """
-    all_bookings = Booking.objects.filter(
-        user=request.user).order_by('-booking_date')
-
     now = timezone.now()
 
-    upcoming_confirmed_bookings = []
-
     pending_payment_bookings = Booking.objects.filter(
         user=request.user,
         status='PENDING_PAYMENT',
@@ -70,23 +64,16 @@ def my_bookings(request):
 
     num_pending_payment = pending_payment_bookings.count()
 
-    for booking in all_bookings:
-        trip_datetime_naive = datetime.combine(
-            booking.trip.date, booking.trip.departure_time)
-        trip_datetime_aware = timezone.make_aware(
-            trip_datetime_naive, timezone.get_current_timezone())
-
-        if booking.status == 'CONFIRMED' and trip_datetime_aware > now:
-            upcoming_confirmed_bookings.append(booking)
-        else:
-            pass
-
-    upcoming_confirmed_bookings.sort(key=lambda b: datetime.combine(
-        b.trip.date, b.trip.departure_time))
-    num_upcoming_trips = len(upcoming_confirmed_bookings)
+    upcoming_confirmed_bookings = Booking.objects.filter(
+        user=request.user,
+        status='CONFIRMED',
+        trip__departure_at__gt=now
+    ).select_related('trip').order_by('trip__departure_at')
+    num_upcoming_trips = upcoming_confirmed_bookings.count()
 
     upcoming_confirmed_bookings_page = paginate_queryset(
-        request, upcoming_confirmed_bookings, items_per_page=3)
+        request, upcoming_confirmed_bookings,
+        ('trip__departure_at', 'pk'), items_per_page=3)
 
     template = 'account/my_bookings.html'
     context = {
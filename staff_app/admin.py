@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import DailyBookingStats
+
+
+@admin.register(DailyBookingStats)
+class DailyBookingStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'date', 'bookings', 'passengers', 'confirmed_bookings',
+        'canceled_bookings', 'paid_revenue', 'refunded_amount', 'updated_at',
+    )
+    readonly_fields = ('updated_at',)
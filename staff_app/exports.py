@@ -0,0 +1,168 @@
+"""
+Streaming exports of bookings and trip manifests.
+
+Rows are read with QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE) and
+written out one line at a time, so an export holds at most one chunk of
+rows in memory however many bookings it covers. The generators here feed
+both the staff export views (as a StreamingHttpResponse) and the
+export_bookings management command.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+import csv
+import json
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Leading characters that make spreadsheet apps read a cell as a formula.
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Bookings whose passengers are expected on board.
+MANIFEST_BOOKING_STATUSES = ('CONFIRMED', 'COMPLETED')
+
+BOOKING_COLUMNS = (
+    'booking_reference', 'booking_date', 'status', 'payment_status',
+    'payment_method_type', 'total_price', 'refund_status', 'refund_amount',
+    'booked_by', 'trip_number', 'origin', 'destination', 'trip_date',
+    'departure_time', 'number_of_passengers', 'passengers',
+)
+
+MANIFEST_COLUMNS = (
+    'trip_number', 'origin', 'destination', 'trip_date', 'departure_time',
+    'bus_number', 'booking_reference', 'booking_status', 'passenger_name',
+    'age', 'contact_number', 'email',
+)
+
+
+class _Echo:
+    """A file-like object whose write() returns the written line."""
+
+    def write(self, value):
+        return value
+
+
+def _booking_record(booking):
+    trip = booking.trip
+    return {
+        'booking_reference': booking.booking_reference,
+        'booking_date': booking.booking_date,
+        'status': booking.status,
+        'payment_status': booking.payment_status,
+        'payment_method_type': booking.payment_method_type,
+        'total_price': booking.total_price,
+        'refund_status': booking.refund_status,
+        'refund_amount': booking.refund_amount,
+        'booked_by': booking.user.username if booking.user else '',
+        'trip_number': trip.trip_number,
+        'origin': trip.origin,
+        'destination': trip.destination,
+        'trip_date': trip.date,
+        'departure_time': trip.departure_time,
+        'number_of_passengers': booking.number_of_passengers,
+        'passengers': [
+            {
+                'name': passenger.name,
+                'age': passenger.age,
+                'contact_number': passenger.contact_number,
+                'email': passenger.email,
+            }
+            for passenger in booking.passengers.all()
+        ],
+    }
+
+
+def _manifest_record(passenger):
+    booking = passenger.booking
+    trip = booking.trip
+    return {
+        'trip_number': trip.trip_number,
+        'origin': trip.origin,
+        'destination': trip.destination,
+        'trip_date': trip.date,
+        'departure_time': trip.departure_time,
+        'bus_number': trip.bus_number,
+        'booking_reference': booking.booking_reference,
+        'booking_status': booking.status,
+        'passenger_name': passenger.name,
+        'age': passenger.age,
+        'contact_number': passenger.contact_number,
+        'email': passenger.email,
+    }
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = '; '.join(passenger['name'] for passenger in value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    # Customer-entered text starting like a formula would be evaluated by
+    # spreadsheet apps; a leading quote makes them show it as text.
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(columns, records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for record in records:
+        yield writer.writerow(
+            [_csv_value(record[column]) for column in columns])
+
+
+def _jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def _lines(columns, records, export_format):
+    if export_format == 'csv':
+        return _csv_lines(columns, records)
+    return _jsonl_lines(records)
+
+
+def stream_bookings(queryset, export_format,
+                    chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the bookings in queryset, newest first, as CSV or JSONL lines.
+    CSV rows list passenger names; JSONL records carry every passenger's
+    details.
+    """
+    from booking.models import Passenger
+
+    bookings = queryset.select_related('trip', 'user').prefetch_related(
+        Prefetch('passengers', queryset=Passenger.objects.order_by('pk'))
+    ).order_by('-booking_date', '-pk')
+    records = (
+        _booking_record(booking)
+        for booking in bookings.iterator(chunk_size=chunk_size))
+    return _lines(BOOKING_COLUMNS, records, export_format)
+
+
+def stream_manifests(trip_queryset, export_format,
+                     chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields one CSV or JSONL line per passenger on a confirmed or completed
+    booking of the trips in trip_queryset, grouped by trip in departure
+    order, from a single streamed query.
+    """
+    from booking.models import Passenger
+
+    passengers = Passenger.objects.filter(
+        booking__trip__in=trip_queryset.values('pk'),
+        booking__status__in=MANIFEST_BOOKING_STATUSES,
+    ).select_related('booking__trip').order_by(
+        'booking__trip__date', 'booking__trip__departure_time',
+        'booking__trip_id', 'booking__booking_reference', 'pk')
+    records = (
+        _manifest_record(passenger)
+        for passenger in passengers.iterator(chunk_size=chunk_size))
+    return _lines(MANIFEST_COLUMNS, records, export_format)
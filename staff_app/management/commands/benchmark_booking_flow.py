@@ -0,0 +1,183 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta, time as dt_time
+from statistics import mean, quantiles
+
+from bkoda import stripe_gateway
+from bkoda.fake_stripe import make_server, build_event, sign_payload
+from booking.models import Booking, BookingPolicy
+from trips.models import Trip
+
+import json
+import threading
+import time
+import urllib.request
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+
+class Command(BaseCommand):
+    """
+    Django management command to benchmark the booking flow offline.
+
+    Starts the fake Stripe server in-process and drives book -> card
+    payment -> webhook confirmation -> cancel with refund through the real
+    views, then prints per-step latency and the Stripe gateway metrics.
+    It creates and afterwards deletes its own user and trip, but still
+    writes to the configured database: run it against a development copy.
+    """
+    help = 'Benchmarks booking, card payment and refund against fake Stripe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--passengers', type=int, default=2)
+        parser.add_argument('--latency-ms', type=float, default=0)
+        parser.add_argument('--jitter-ms', type=float, default=0)
+        parser.add_argument('--failure-rate', type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        server = make_server(
+            port=0,
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        api_base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        with override_settings(
+                STRIPE_API_BASE=api_base,
+                STRIPE_MOCK_REFUNDS=False,
+                STRIPE_WH_SECRET=WEBHOOK_SECRET,
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                ALLOWED_HOSTS=['testserver']):
+            stripe_gateway.reset_client()
+            stripe_gateway.reset_stripe_metrics()
+            try:
+                timings, failures = self._run(server, api_base, options)
+            finally:
+                stripe_gateway.reset_client()
+                server.shutdown()
+                server.server_close()
+
+        self._report(timings, failures, options['iterations'])
+
+    def _run(self, server, api_base, options):
+        passengers = options['passengers']
+        BookingPolicy.objects.get_or_create(name="Standard Booking Policy")
+        user = User.objects.create_user(
+            username=f"benchmark-{int(time.time())}",
+            email='benchmark@example.com')
+        trip = Trip.objects.create(
+            trip_number='BENCH',
+            origin='Benchmark Origin',
+            destination='Benchmark Destination',
+            date=timezone.localdate() + timedelta(days=7),
+            departure_time=dt_time(8, 0),
+            arrival_time=dt_time(11, 0),
+            available_seats=options['iterations'] * passengers,
+            price=100,
+        )
+        client = Client()
+        client.force_login(user)
+
+        timings = {}
+        failures = 0
+        try:
+            for _ in range(options['iterations']):
+                try:
+                    self._run_once(
+                        client, server, api_base, trip, passengers, timings)
+                except Exception as e:
+                    failures += 1
+                    self.stderr.write(f"Iteration failed: {e}")
+                    Booking.objects.filter(
+                        user=user, status='PENDING_PAYMENT').update(
+                            status='CANCELED')
+        finally:
+            trip.delete()
+            user.delete()
+        return timings, failures
+
+    def _timed(self, timings, step, func):
+        started = time.perf_counter()
+        result = func()
+        timings.setdefault(step, []).append(time.perf_counter() - started)
+        return result
+
+    def _run_once(self, client, server, api_base, trip, passengers, timings):
+        booking_data = {'payment_method_type': 'CARD'}
+        for i in range(1, passengers + 1):
+            booking_data.update({
+                f'passenger_name{i}': f'Passenger {i}',
+                f'passenger_email{i}': 'benchmark@example.com',
+                f'passenger_contact_number{i}': '09171234567',
+            })
+        book_url = reverse('book_trip', args=[trip.pk, passengers])
+        response = self._timed(
+            timings, 'book', lambda: client.post(book_url, booking_data))
+        booking = Booking.objects.filter(trip=trip).latest('id')
+        payment_url = response.url
+
+        self._timed(timings, 'payment_page', lambda: client.get(payment_url))
+        intent = self._timed(timings, 'create_intent', lambda: client.post(
+            reverse('create_payment_intent', args=[booking.pk])).json())
+        if 'payment_intent_id' not in intent:
+            raise RuntimeError(intent.get('error', 'no PaymentIntent'))
+
+        # Stands in for Stripe.js confirming the card in the browser.
+        confirm = urllib.request.Request(
+            f"{api_base}/v1/payment_intents/"
+            f"{intent['payment_intent_id']}/confirm",
+            data=b'', method='POST')
+        with urllib.request.urlopen(confirm, timeout=10) as reply:
+            confirmed_intent = json.loads(reply.read())
+
+        self._timed(timings, 'submit_payment', lambda: client.post(
+            payment_url, {
+                'selected_payment_method_hidden': 'CARD',
+                'payment_intent_id': intent['payment_intent_id'],
+            }))
+
+        charge = server.state.charges[confirmed_intent['latest_charge']]
+        for event_type, obj in (
+                ('payment_intent.succeeded', confirmed_intent),
+                ('charge.succeeded', charge)):
+            payload = build_event(event_type, obj)
+            self._timed(timings, 'webhook', lambda: client.post(
+                reverse('webhook'), payload,
+                content_type='application/json',
+                HTTP_STRIPE_SIGNATURE=sign_payload(payload, WEBHOOK_SECRET)))
+
+        booking.refresh_from_db()
+        if booking.status != 'CONFIRMED':
+            raise RuntimeError(f"booking not confirmed ({booking.status})")
+
+        self._timed(timings, 'cancel_refund', lambda: client.post(
+            reverse('manage_booking:booking_cancel', args=[booking.pk])))
+        booking.refresh_from_db()
+        if booking.status != 'CANCELED':
+            raise RuntimeError(f"booking not canceled ({booking.status})")
+
+    def _report(self, timings, failures, iterations):
+        self.stdout.write(
+            f"{iterations - failures}/{iterations} flows completed.")
+        for step, samples in timings.items():
+            p95 = quantiles(samples, n=20)[-1] if len(samples) > 1 \
+                else samples[0]
+            self.stdout.write(
+                f"  {step:<15} n={len(samples):<4} "
+                f"mean={mean(samples) * 1000:7.1f}ms "
+                f"p95={p95 * 1000:7.1f}ms")
+
+        metrics = stripe_gateway.get_stripe_metrics()
+        self.stdout.write(f"Stripe breaker: {metrics['breaker_state']}")
+        for operation, entry in metrics['operations'].items():
+            self.stdout.write(
+                f"  {operation:<25} calls={entry['calls']:<4} "
+                f"errors={entry['errors']:<3} "
+                f"avg={entry['avg_latency_ms']:6.1f}ms "
+                f"max={entry['max_latency_ms']:6.1f}ms")
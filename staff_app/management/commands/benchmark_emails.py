@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from decimal import Decimal
+from statistics import mean
+
+from booking.models import Booking
+from booking.utils import (
+    EMAIL_TYPES, build_email_context, prefetch_email_data,
+    render_booking_email,
+)
+
+import time
+
+# Extra context some email types expect, as the views pass it.
+SAMPLE_CONTEXT = {
+    'reason': 'Benchmark run.',
+    'refund_amount': Decimal('450.00'),
+    'refund_reference': 're_benchmark',
+    'payment_intent_id': 'pi_benchmark',
+    'payment_url': 'https://example.com/pay/',
+    'amount_to_pay': Decimal('0'),
+    'amount_to_refund': Decimal('0'),
+    'fare_difference_display': 'Php0.00',
+    'rescheduling_charge_display': 'Php0.00',
+}
+
+
+class Command(BaseCommand):
+    """
+    Django management command to micro-benchmark email rendering.
+
+    Renders every email type for one existing booking, timing the
+    compiled-template path used for sending against the previous
+    render_to_string + strip_tags approach. Read-only.
+    """
+    help = 'Benchmarks rendering of each booking email type.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument(
+            '--booking',
+            help='Booking reference to render; defaults to the latest.')
+        parser.add_argument(
+            '--type',
+            choices=sorted(EMAIL_TYPES),
+            action='append',
+            help='Email type to benchmark; may be repeated.')
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.order_by('-pk')
+        if options['booking']:
+            bookings = bookings.filter(booking_reference=options['booking'])
+        booking = bookings.first()
+        if booking is None:
+            raise CommandError("No booking found to render.")
+        booking = prefetch_email_data([booking])[0]
+
+        _, context = build_email_context(
+            booking, current_date=timezone.now(), **SAMPLE_CONTEXT)
+        iterations = options['iterations']
+        self.stdout.write(
+            f"Rendering booking {booking.booking_reference}, "
+            f"{iterations} iterations per type.")
+
+        for email_type in options['type'] or sorted(EMAIL_TYPES):
+            compiled = self._time(
+                iterations,
+                lambda: render_booking_email(email_type, context))
+            legacy = self._time(
+                iterations,
+                lambda: self._render_legacy(email_type, context))
+            self.stdout.write(
+                f"  {email_type:<29} "
+                f"compiled={compiled * 1e6:8.1f}us "
+                f"({1 / compiled:7.0f}/s)  "
+                f"legacy={legacy * 1e6:8.1f}us "
+                f"({1 / legacy:7.0f}/s)")
+
+        self.stdout.write(self.style.SUCCESS("Email benchmark finished."))
+
+    def _render_legacy(self, email_type, context):
+        _, template_name = EMAIL_TYPES[email_type]
+        html_content = render_to_string(f"{template_name}.html", context)
+        return strip_tags(html_content), html_content
+
+    def _time(self, iterations, func):
+        func()
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+        return mean(samples)
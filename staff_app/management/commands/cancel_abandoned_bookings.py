@@ -1,11 +1,9 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Q
-from django.utils import timezone
-from datetime import timedelta
-from booking.models import Booking
-from booking.utils import send_booking_email
-from django.db import transaction
-from staff_app.utils import get_all_abandoned_bookings
+from staff_app.utils import (
+    cancel_pending_bookings, get_abandoned_booking_querysets,
+)
+
+import time
 
 
 class Command(BaseCommand):
@@ -14,90 +12,76 @@ class Command(BaseCommand):
 
     1. Cancels unpaid bookings that are more than 1 hour old.
     2. Cancels pending bookings for trips that have already departed.
-    3. Cancels unpaid bookings older than 24 hours.
+    3. Cancels unpaid bookings older than 24 hours and queues an email to
+       their customers in the outbox, for the send_queued_emails worker.
+
+    Bookings are cancelled in batches, each in its own short transaction,
+    and their seats are returned to their trips.
     """
     help = 'Cancels all abandoned bookings based on their status and trip \
         departure.'
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Bookings cancelled per transaction.')
 
-        abandoned_bookings = get_all_abandoned_bookings()
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size') or 500
+        # Fresh querysets rather than the cached dashboard counts: the
+        # batches simply stop when nothing is left to cancel.
+        abandoned_bookings = get_abandoned_booking_querysets()
 
         # --- Task 1: Cancel old, null-payment bookings ---
-        null_bookings = abandoned_bookings['null_bookings']
-        null_count = abandoned_bookings['null_count']
-
-        if null_count > 0:
-            try:
-                with transaction.atomic():
-                    updated_null_count = null_bookings.update(
-                        status='CANCELLED',
-                        payment_status='FAILED',
-                    )
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Successfully cancelled {updated_null_count} old,"
-                        f"null-payment booking(s). "))
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"An error occurred while cancelling old null"
-                        f"bookings: {e}"))
-        else:
-            self.stdout.write(
-                self.style.SUCCESS(
-                    "No old, null-payment bookings found to cancel."))
+        self._cancel(
+            abandoned_bookings['null'],
+            batch_size,
+            'old, null-payment')
 
         # --- Task 2: Cancel pending bookings for past trips ---
-        departed_bookings = abandoned_bookings['departed_bookings']
-        departed_count = abandoned_bookings['departed_count']
-
-        if departed_count > 0:
-            try:
-                with transaction.atomic():
-                    updated_departed_count = departed_bookings.update(
-                        status='CANCELLED',
-                        payment_status='FAILED',
-                    )
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Successfully cancelled {updated_departed_count}"
-                        f"departed pending booking(s). "))
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"An error occurred while cancelling departed"
-                        f"bookings: {e}"))
-        else:
-            self.stdout.write(
-                self.style.SUCCESS(
-                    "No departed pending bookings found to cancel."))
+        self._cancel(
+            abandoned_bookings['departed'],
+            batch_size,
+            'departed pending')
 
         # --- Task 3: Cancel unpaid bookings older than 24 hours ---
-        unpaid_bookings = abandoned_bookings['unpaid_bookings']
-        unpaid_count = abandoned_bookings['unpaid_count']
+        self._cancel(
+            abandoned_bookings['unpaid'],
+            batch_size,
+            'unpaid',
+            email_type='cancellation_unpaid')
+
+        self.stdout.write(self.style.SUCCESS("Finished cleanup process."))
 
-        if unpaid_count > 0:
-            try:
-                with transaction.atomic():
-                    updated_unpaid_count = unpaid_bookings.update(
-                        status='CANCELLED',
-                        payment_status='FAILED',
-                    )
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Successfully cancelled {updated_unpaid_count}"
-                        f"unpaid booking(s). "))
-                send_booking_email(
-                    unpaid_bookings, email_type='cancellation_unpaid')
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"An error occurred while cancelling unpaid"
-                        f"bookings: {e}"))
-        else:
+    def _cancel(self, bookings, batch_size, label, email_type=None):
+        """
+        Cancels one category of abandoned bookings, queueing email_type to
+        each if given, reports the result and returns the ids cancelled.
+        """
+        started = time.perf_counter()
+        try:
+            cancelled_ids = cancel_pending_bookings(
+                bookings, batch_size, email_type)
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"An error occurred while cancelling {label} "
+                    f"bookings: {e}"))
+            return []
+        if not cancelled_ids:
+            self.stdout.write(
+                self.style.SUCCESS(f"No {label} bookings found to cancel."))
+            return []
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully cancelled {len(cancelled_ids)} {label} "
+                f"booking(s) and released their seats."))
+        if email_type:
             self.stdout.write(
                 self.style.SUCCESS(
-                    "No unpaid bookings found to cancel."))
-
-        self.stdout.write(self.style.SUCCESS("Finished cleanup process."))
+                    f"Queued {len(cancelled_ids)} {email_type} email(s) "
+                    f"for send_queued_emails in "
+                    f"{time.perf_counter() - started:.2f}s."))
+        return cancelled_ids
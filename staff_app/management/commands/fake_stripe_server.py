@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from bkoda.fake_stripe import make_server
+
+
+class Command(BaseCommand):
+    """
+    Django management command to run a local fake Stripe API.
+
+    Point the app at it with STRIPE_API_BASE=http://127.0.0.1:12111 to
+    exercise checkout, reschedule payments and refunds offline. Latency
+    and failures can be injected to see how the app behaves when Stripe is
+    slow or erroring.
+    """
+    help = 'Runs a fake Stripe API server for load and integration tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument(
+            '--latency-ms', type=float, default=0,
+            help='Delay added to every response.')
+        parser.add_argument(
+            '--jitter-ms', type=float, default=0,
+            help='Random +/- variation of the delay.')
+        parser.add_argument(
+            '--failure-rate', type=float, default=0.0,
+            help='Share of requests answered with a 500 error (0-1).')
+        parser.add_argument(
+            '--webhook-url',
+            help='Where to deliver signed events, e.g. '
+                 'http://127.0.0.1:8000/booking/wh/')
+        parser.add_argument(
+            '--webhook-secret',
+            help='Signing secret; must match STRIPE_WH_SECRET.')
+
+    def handle(self, *args, **options):
+        server = make_server(
+            host=options['host'],
+            port=options['port'],
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+            webhook_url=options['webhook_url'],
+            webhook_secret=options['webhook_secret'],
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fake Stripe listening on http://{host}:{port} "
+                f"(set STRIPE_API_BASE to this URL)."))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from booking.idempotency import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    """
+    Django management command to delete expired idempotency keys.
+
+    Keys only need to outlive a form's double submissions, so rows older
+    than IDEMPOTENCY_KEY_TTL_HOURS are removed. Meant to run daily from a
+    scheduler.
+    """
+    help = 'Deletes expired booking and payment idempotency keys.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} expired idempotency key(s)."))
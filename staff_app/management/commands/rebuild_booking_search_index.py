@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from booking.models import Booking
+from booking.search import update_search_index
+
+
+class Command(BaseCommand):
+    """
+    Django management command to rewrite the booking search index.
+
+    The index is kept up to date as passengers are saved; this rebuilds
+    it for every booking, in batches walked by primary key, e.g. after
+    changing how tokens are normalized.
+    """
+    help = 'Rebuilds the staff booking search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Bookings to index per batch.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        indexed = 0
+        last_pk = 0
+        while True:
+            booking_ids = list(
+                Booking.objects.filter(pk__gt=last_pk).order_by(
+                    'pk').values_list('pk', flat=True)[:batch_size])
+            if not booking_ids:
+                break
+            update_search_index(booking_ids)
+            indexed += len(booking_ids)
+            last_pk = booking_ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {indexed} booking(s)."))
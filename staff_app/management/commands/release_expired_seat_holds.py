@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from booking.holds import release_expired_seat_holds
+
+
+class Command(BaseCommand):
+    """
+    Django management command to release expired checkout seat holds.
+
+    Cancels the bookings whose hold expired before payment and returns
+    their seats to the trips. Meant to run every minute or so from a
+    scheduler; request handlers also trigger it opportunistically.
+    """
+    help = 'Releases expired seat holds and cancels their bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of holds released per transaction.')
+
+    def handle(self, *args, **options):
+        released = release_expired_seat_holds(
+            batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Released {released} expired seat hold(s)."))
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils import timezone
+from datetime import timedelta
+from booking.models import Booking
+from booking.stats_cache import booking_stats_changed
+from staff_app.models import DailyBookingStats
+
+
+class Command(BaseCommand):
+    """
+    Django management command to maintain the DailyBookingStats rollup.
+
+    Rolls up every finished day since the last run and re-rolls the last
+    DAILY_BOOKING_STATS_REFRESH_DAYS days. Bookings that change after
+    their day was rolled up recompute it themselves (see
+    booking_stats_changed); the re-roll and --rebuild catch changes made
+    outside the app. Meant to run at least daily from a scheduler.
+    """
+    help = 'Rolls up booking totals per day for the staff dashboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.DAILY_BOOKING_STATS_REFRESH_DAYS,
+            help='Recent finished days to recompute.')
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every day since the first booking.')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        latest = DailyBookingStats.objects.aggregate(
+            latest=Max('date'))['latest']
+
+        if options['rebuild'] or latest is None:
+            first_booking = Booking.objects.aggregate(
+                first=Min('booking_date'))['first']
+            if first_booking is None:
+                self.stdout.write(
+                    self.style.SUCCESS("No bookings to roll up."))
+                return
+            start = timezone.localdate(first_booking)
+        else:
+            start = min(
+                latest + timedelta(days=1),
+                today - timedelta(days=options['days']))
+
+        if start >= today:
+            self.stdout.write(
+                self.style.SUCCESS("Booking stats are up to date."))
+            return
+
+        rows = DailyBookingStats.rollup(start, today)
+        booking_stats_changed()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rolled up {rows} day(s) of bookings from {start} to "
+                f"{today - timedelta(days=1)}."))
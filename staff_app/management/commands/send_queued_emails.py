@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from booking.outbox import send_queued_emails
+
+import time
+
+
+class Command(BaseCommand):
+    """
+    Django management command to deliver queued booking emails.
+
+    Drains the EmailOutbox in batches, each sent over a single SMTP
+    connection. With --loop it keeps polling, which is how it runs as a
+    background worker; without it, it drains what is due and exits, for
+    use from a scheduler.
+    """
+    help = 'Sends queued booking emails from the email outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Emails sent per SMTP connection.')
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll for new emails.')
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Seconds to wait between polls when the queue is empty.')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        started = time.perf_counter()
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(
+                    f"Sent {sent} email(s), {failed} failed.")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        elapsed = time.perf_counter() - started
+        rate = total_sent / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {total_sent} sent, {total_failed} failed in "
+                f"{elapsed:.2f}s ({rate:.1f}/s)."))
@@ -0,0 +1,115 @@
+from django.db import models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from booking.models import Booking
+
+
+def start_of_day(date):
+    """Returns the aware datetime at which `date` starts."""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+class DailyBookingStats(models.Model):
+    """
+    Rolled-up booking totals per booking date, maintained by the
+    rollup_booking_stats command and recomputed whenever a booking made on
+    a rolled-up day changes. The staff dashboard reads historical totals
+    from here and only aggregates bookings made since the last rolled-up
+    day, so its cost does not grow with the bookings table.
+    """
+    date = models.DateField(unique=True)
+    bookings = models.PositiveIntegerField(default=0)
+    passengers = models.PositiveIntegerField(default=0)
+    confirmed_bookings = models.PositiveIntegerField(default=0)
+    canceled_bookings = models.PositiveIntegerField(default=0)
+    paid_revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'))
+    refunded_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily booking stats'
+
+    @classmethod
+    def rollup(cls, start_date, end_date):
+        """
+        Recomputes the rows for start_date up to, but excluding, end_date
+        from the bookings made on those days with one grouped query, and
+        returns the number of rows written. Days without bookings get no
+        row.
+        """
+        rows = Booking.objects.filter(
+            booking_date__gte=start_of_day(start_date),
+            booking_date__lt=start_of_day(end_date),
+        ).annotate(
+            day=TruncDate('booking_date')
+        ).values('day').annotate(
+            bookings=Count('pk'),
+            passengers=Sum('number_of_passengers'),
+            confirmed_bookings=Count('pk', filter=Q(status='CONFIRMED')),
+            canceled_bookings=Count('pk', filter=Q(status='CANCELED')),
+            paid_revenue=Sum('total_price', filter=Q(payment_status='PAID')),
+            refunded_amount=Sum('refund_amount'),
+        ).order_by()
+
+        stats = [
+            cls(
+                date=row['day'],
+                bookings=row['bookings'],
+                passengers=row['passengers'] or 0,
+                confirmed_bookings=row['confirmed_bookings'],
+                canceled_bookings=row['canceled_bookings'],
+                paid_revenue=row['paid_revenue'] or Decimal('0.00'),
+                refunded_amount=row['refunded_amount'] or Decimal('0.00'),
+            )
+            for row in rows
+        ]
+        cls.objects.filter(
+            date__gte=start_date, date__lt=end_date
+        ).exclude(date__in=[row.date for row in stats]).delete()
+        cls.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=[
+                'bookings', 'passengers', 'confirmed_bookings',
+                'canceled_bookings', 'paid_revenue', 'refunded_amount',
+                'updated_at',
+            ],
+        )
+        return len(stats)
+
+    @classmethod
+    def rollup_bookings(cls, booking_ids):
+        """
+        Recomputes the rows of the rolled-up days on which the given
+        bookings (ids, or a queryset of them) were made. Bookings made
+        today, or after the last rolled-up day, are already counted live
+        and are left alone.
+        """
+        days = set(Booking.objects.filter(
+            pk__in=booking_ids,
+            booking_date__lt=start_of_day(timezone.localdate()),
+        ).annotate(
+            day=TruncDate('booking_date')
+        ).values_list('day', flat=True))
+        if not days:
+            return 0
+        rolled_through = cls.objects.aggregate(
+            latest=Max('date'))['latest']
+        return sum(
+            cls.rollup(day, day + timedelta(days=1))
+            for day in sorted(days)
+            if rolled_through and day <= rolled_through)
+
+    def __str__(self):
+        return f"{self.date}: {self.bookings} bookings"
@@ -7,6 +7,14 @@ urlpatterns = [
     path('', views.staff_dashboard, name='dashboard'),
     path('trips/', views.trips_list, name='trips_list'),
     path('bookings/', views.bookings_list, name='bookings_list'),
+    path(
+        'bookings/export/',
+        views.export_bookings,
+        name='export_bookings'),
+    path(
+        'trips/manifests/export/',
+        views.export_manifests,
+        name='export_manifests'),
     path(
         'generate-trips/',
         views.generate_trips_view,
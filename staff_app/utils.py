@@ -1,43 +1,264 @@
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
 from django.utils import timezone
-from datetime import timedelta
-from booking.models import Booking
+from datetime import datetime, timedelta
+from booking.models import Booking, SeatHold
+from booking.search import search_bookings
+from booking.stats_cache import booking_stats_changed, cached_booking_stats
+from booking.utils import queue_booking_emails
+from manage_booking.pagination import approximate_count
+from trips.inventory import release_seats_by_trip
+from trips.models import Trip
+from trips.utils import match_route_ids
+from .models import DailyBookingStats, start_of_day
 
 
-def get_all_abandoned_bookings():
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _date_filter(params, name, strict):
     """
-    Returns a dictionary of QuerySets for and calculate counts of null,
-    departed, and unpaid bookings.
+    Returns the date in params[name], or None if it is missing or, unless
+    strict, invalid. With strict, an invalid date raises ValueError.
+    """
+    if not params.get(name):
+        return None
+    try:
+        return _parse_date(params[name])
+    except ValueError:
+        if strict:
+            raise ValueError(
+                f"Invalid {name} '{params[name]}'; use YYYY-MM-DD.")
+        return None
+
+
+def filter_bookings(queryset, params, strict=False):
+    """
+    Applies the bookings list filters in `params` (trip_number,
+    customer_name, status, refund_status, trip_date) to a booking
+    queryset. Returns the queryset and whether any filter applied. An
+    invalid trip_date is ignored, or raises ValueError with strict.
     """
-    cutoff_time_null = timezone.now() - timedelta(hours=1)
-    null_bookings_queryset = Booking.objects.filter(
-        Q(payment_method_type__isnull=True) | Q(payment_method_type=''),
-        status='PENDING_PAYMENT',
-        booking_date__lt=cutoff_time_null
-    )
-    null_count = null_bookings_queryset.count()
+    filtered = False
+    if params.get('trip_number'):
+        queryset = queryset.filter(
+            trip__trip_number__icontains=params['trip_number'])
+        filtered = True
+    if params.get('customer_name'):
+        queryset = search_bookings(queryset, params['customer_name'])
+        filtered = True
+    if params.get('status'):
+        queryset = queryset.filter(status__iexact=params['status'])
+        filtered = True
+    if params.get('refund_status'):
+        queryset = queryset.filter(refund_status=params['refund_status'])
+        filtered = True
+    trip_date = _date_filter(params, 'trip_date', strict)
+    if trip_date:
+        queryset = queryset.filter(trip__date=trip_date)
+        filtered = True
+    return queryset, filtered
 
+
+def filter_trips(queryset, params, strict=False):
+    """
+    Applies the trips list filters in `params` (date, origin,
+    destination) to a trip queryset. Returns the queryset and whether any
+    filter applied. An invalid date is ignored, or raises ValueError with
+    strict.
+    """
+    filtered = False
+    date = _date_filter(params, 'date', strict)
+    if date:
+        queryset = queryset.filter(date=date)
+        filtered = True
+    if params.get('origin') or params.get('destination'):
+        queryset = queryset.filter(route_id__in=match_route_ids(
+            params.get('origin'), params.get('destination')))
+        filtered = True
+    return queryset, filtered
+
+
+def _abandoned_filters():
+    """
+    Returns the Q filter for each kind of abandoned PENDING_PAYMENT
+    booking: null (no payment method after 1 hour), departed (trip has
+    left) and unpaid (payment still pending after 24 hours).
+    """
     now = timezone.now()
-    departed_bookings_queryset = Booking.objects.filter(
-        Q(trip__date__lt=now.date()) | Q(
-            trip__date=now.date(), trip__departure_time__lt=now.time()),
-        status='PENDING_PAYMENT'
-    )
-    departed_count = departed_bookings_queryset.count()
-
-    cutoff_time_unpaid = timezone.now() - timedelta(hours=24)
-    unpaid_bookings_queryset = Booking.objects.filter(
-        status='PENDING_PAYMENT',
-        payment_status='PENDING',
-        booking_date__lt=cutoff_time_unpaid
-    )
-    unpaid_count = unpaid_bookings_queryset.count()
+    return {
+        'null': Q(
+            Q(payment_method_type__isnull=True) | Q(payment_method_type=''),
+            booking_date__lt=now - timedelta(hours=1)),
+        'departed': Q(trip__departure_at__lt=now),
+        'unpaid': Q(
+            payment_status='PENDING',
+            booking_date__lt=now - timedelta(hours=24)),
+    }
 
+
+def get_abandoned_booking_querysets():
+    """
+    Returns a dictionary of lazy QuerySets of null, departed and unpaid
+    bookings.
+    """
+    pending = Booking.objects.filter(status='PENDING_PAYMENT')
     return {
-        'null_bookings': null_bookings_queryset,
-        'null_count': null_count,
-        'departed_bookings': departed_bookings_queryset,
-        'departed_count': departed_count,
-        'unpaid_bookings': unpaid_bookings_queryset,
-        'unpaid_count': unpaid_count,
+        name: pending.filter(condition)
+        for name, condition in _abandoned_filters().items()
     }
+
+
+def get_abandoned_booking_counts():
+    """
+    Returns the number of null, departed and unpaid bookings, counted in
+    one conditional-aggregation query and cached until a booking changes
+    state or BOOKING_STATS_CACHE_TIMEOUT passes.
+    """
+    def compute():
+        return Booking.objects.filter(status='PENDING_PAYMENT').aggregate(
+            **{
+                f'{name}_count': Count('pk', filter=condition)
+                for name, condition in _abandoned_filters().items()
+            })
+
+    return cached_booking_stats('abandoned_counts', compute)
+
+
+def get_all_abandoned_bookings():
+    """
+    Returns a dictionary of QuerySets for, and cached counts of, null,
+    departed, and unpaid bookings.
+    """
+    querysets = get_abandoned_booking_querysets()
+    return {
+        'null_bookings': querysets['null'],
+        'departed_bookings': querysets['departed'],
+        'unpaid_bookings': querysets['unpaid'],
+        **get_abandoned_booking_counts(),
+    }
+
+
+def cancel_pending_bookings(queryset, batch_size=500, email_type=None):
+    """
+    Cancels the PENDING_PAYMENT bookings in queryset in batches, returns
+    their seats and returns the ids of the bookings cancelled.
+
+    Each batch runs in its own short transaction: the booking rows are
+    locked (skipping rows another worker holds), cancelled with one
+    UPDATE, their seat holds dropped and their passengers' seats returned
+    with one F() increment per trip. With email_type, the batch's emails
+    are queued in the outbox in the same transaction.
+    """
+    cancelled_ids = []
+
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.filter(
+                status='PENDING_PAYMENT'
+            ).select_for_update(
+                skip_locked=True, of=('self',)
+            ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            seats_by_trip_id = dict(Booking.objects.filter(
+                pk__in=ids
+            ).values('trip_id').annotate(
+                seats=Sum('number_of_passengers')
+            ).order_by().values_list('trip_id', 'seats'))
+
+            Booking.objects.filter(pk__in=ids).update(
+                status='CANCELED',
+                payment_status='FAILED',
+            )
+            SeatHold.objects.filter(booking_id__in=ids).delete()
+            release_seats_by_trip(seats_by_trip_id)
+            if email_type:
+                queue_booking_emails(ids, email_type)
+            booking_stats_changed(ids)
+
+        cancelled_ids.extend(ids)
+
+    return cancelled_ids
+
+
+TOTAL_TRIPS_CACHE_KEY = 'staff:dashboard:total_trips'
+
+
+def _total_trips():
+    """
+    Returns the number of trips, cached on its own since booking changes,
+    which invalidate the other dashboard stats, don't change it. Uses the
+    planner's estimate on PostgreSQL, like the unfiltered trips list.
+    """
+    total = cache.get(TOTAL_TRIPS_CACHE_KEY)
+    if total is None:
+        total = approximate_count(Trip.objects.all())
+        cache.set(TOTAL_TRIPS_CACHE_KEY, total,
+                  settings.BOOKING_STATS_CACHE_TIMEOUT)
+    return total
+
+
+def get_dashboard_stats():
+    """
+    Returns the staff dashboard metrics, cached like the abandoned-booking
+    counts.
+
+    Totals for finished days come from the DailyBookingStats rollup.
+    Everything else is one conditional aggregate over the bookings made
+    since the last rolled-up day plus the pending and pending-refund
+    bookings, so the work does not grow with the bookings table. The trip
+    count is cached separately, see _total_trips.
+    """
+    def compute():
+        rolled = DailyBookingStats.objects.aggregate(
+            rolled_through=Max('date'),
+            bookings=Sum('bookings'),
+            confirmed_bookings=Sum('confirmed_bookings'),
+            paid_revenue=Sum('paid_revenue'),
+        )
+        if rolled['rolled_through']:
+            recent = Q(booking_date__gte=start_of_day(
+                rolled['rolled_through'] + timedelta(days=1)))
+        else:
+            recent = Q(pk__isnull=False)
+        pending = Q(status='PENDING_PAYMENT')
+        pending_refund = Q(status='CANCELED', refund_status='PENDING')
+
+        metrics = {
+            'recent_bookings': Count('pk', filter=recent),
+            'recent_confirmed': Count(
+                'pk', filter=recent & Q(status='CONFIRMED')),
+            'recent_revenue': Sum(
+                'total_price', filter=recent & Q(payment_status='PAID')),
+            'pending_bookings': Count('pk', filter=pending),
+            'pending_refunds': Count('pk', filter=pending_refund),
+        }
+        for name, condition in _abandoned_filters().items():
+            metrics[f'{name}_count'] = Count(
+                'pk', filter=pending & condition)
+        live = Booking.objects.filter(
+            recent | pending | pending_refund).aggregate(**metrics)
+
+        return {
+            'total_bookings':
+                (rolled['bookings'] or 0) + live['recent_bookings'],
+            'pending_bookings': live['pending_bookings'],
+            'pending_refunds': live['pending_refunds'],
+            'confirmed_bookings':
+                (rolled['confirmed_bookings'] or 0) +
+                live['recent_confirmed'],
+            'total_revenue_confirmed':
+                (rolled['paid_revenue'] or 0) +
+                (live['recent_revenue'] or 0),
+            'null_count': live['null_count'],
+            'departed_count': live['departed_count'],
+            'unpaid_count': live['unpaid_count'],
+        }
+
+    stats = cached_booking_stats('dashboard', compute)
+    return dict(stats, total_trips=_total_trips())
@@ -1,8 +1,13 @@
+from django.http import (
+    Http404, HttpResponseBadRequest, StreamingHttpResponse,
+)
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db import transaction
-from django.db.models import Sum, Min, Max, Q
+from django.db.models import Count, Sum, Min, Max, Q
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from trips.models import Trip
@@ -14,12 +19,19 @@ from booking.models import (
     PAYMENT_METHOD_CHOICES
     )
 from staff_app.forms import TripForm, BookingForm
+from manage_booking.pagination import approximate_count
 from manage_booking.utils import paginate_queryset
 from io import StringIO
 from .management.commands.generate_trips import Command as GenerateTripsCommand
 from .management.commands.cancel_abandoned_bookings \
     import Command as CancelNullBookingsCommand
-from .utils import get_all_abandoned_bookings
+from .exports import EXPORT_FORMATS, stream_bookings, stream_manifests
+from .utils import (
+    filter_bookings,
+    filter_trips,
+    get_all_abandoned_bookings,
+    get_dashboard_stats,
+)
 from datetime import datetime, timedelta
 import re
 
@@ -35,6 +47,40 @@ def remove_ansi_codes(text):
     return ansi_escape.sub('', text)
 
 
+def _export_urls(request, url_name):
+    """
+    Returns the export URL for each format, carrying the list's current
+    filters but not its page.
+    """
+    query = request.GET.copy()
+    query.pop('page', None)
+    urls = {}
+    for export_format in EXPORT_FORMATS:
+        query['format'] = export_format
+        urls[export_format] = f"{reverse(url_name)}?{query.urlencode()}"
+    return urls
+
+
+def _count_and_range(queryset, date_field, approximate=False):
+    """
+    Returns the row count and the earliest and latest `date_field` of a
+    list. Unfiltered lists use the approximate count and read the range
+    from the ends of the date index; filtered ones get all three from one
+    aggregate.
+    """
+    if approximate:
+        date_range = queryset.aggregate(
+            min_date=Min(date_field), max_date=Max(date_field))
+        count = approximate_count(queryset)
+    else:
+        date_range = queryset.aggregate(
+            count=Count('pk'),
+            min_date=Min(date_field),
+            max_date=Max(date_field))
+        count = date_range['count']
+    return count, date_range['min_date'], date_range['max_date']
+
+
 # --- Dashboard View ---
 @login_required
 @user_passes_test(is_staff_user, login_url='/accounts/login/')
@@ -42,32 +88,21 @@ def staff_dashboard(request):
     """
     Staff Dashboard - Provides an overview and navigation.
     """
-    total_trips = Trip.objects.count()
-    total_bookings = Booking.objects.count()
-    pending_bookings = Booking.objects.filter(status='PENDING_PAYMENT').count()
-    pending_refunds = Booking.objects.filter(
-        status='CANCELED',
-        refund_status='PENDING').count()
-    confirmed_bookings = Booking.objects.filter(status='CONFIRMED').count()
-
-    total_revenue_confirmed = Booking.objects.filter(
-        payment_status='PAID').aggregate(Sum(
-            'total_price'))['total_price__sum'] or 0
-
-    abandoned_bookings = get_all_abandoned_bookings()
+    stats = get_dashboard_stats()
 
     context = {
-        'total_trips': total_trips,
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'pending_refunds': pending_refunds,
-        'confirmed_bookings': confirmed_bookings,
-        'total_revenue_confirmed': total_revenue_confirmed,
-        'recent_bookings': Booking.objects.order_by('-booking_date')[:5],
+        'total_trips': stats['total_trips'],
+        'total_bookings': stats['total_bookings'],
+        'pending_bookings': stats['pending_bookings'],
+        'pending_refunds': stats['pending_refunds'],
+        'confirmed_bookings': stats['confirmed_bookings'],
+        'total_revenue_confirmed': stats['total_revenue_confirmed'],
+        'recent_bookings': Booking.objects.select_related(
+            'user', 'trip').order_by('-booking_date')[:5],
         'upcoming_trips': Trip.objects.order_by('date')[:5],
-        'unpaid_bookings_count': abandoned_bookings['unpaid_count'],
-        'departed_bookings_count': abandoned_bookings['departed_count'],
-        'null_bookings_count': abandoned_bookings['null_count']
+        'unpaid_bookings_count': stats['unpaid_count'],
+        'departed_bookings_count': stats['departed_count'],
+        'null_bookings_count': stats['null_count']
     }
     return render(request, 'staff_app/dashboard.html', context)
 
@@ -118,39 +153,17 @@ def trips_list(request):
             messages.error(request, 'Invalid action for trip operation.')
         return redirect('staff_app:trips_list')
 
-    trips_list = Trip.objects.all()
-
     filter_date = request.GET.get('date')
     filter_destination = request.GET.get('destination')
     filter_origin = request.GET.get('origin')
 
-    if filter_date:
-        try:
-            date_obj = datetime.strptime(filter_date, '%Y-%m-%d').date()
-            trips_list = trips_list.filter(date=date_obj)
-        except ValueError:
-            pass
-
-    if filter_destination:
-        trips_list = trips_list.filter(
-            destination__icontains=filter_destination)
-
-    if filter_origin:
-        trips_list = trips_list.filter(origin__icontains=filter_origin)
-
-    trips_list = trips_list.order_by('date', 'departure_time')
+    trips_list, filtered = filter_trips(Trip.objects.all(), request.GET)
+    trip_count, min_date, max_date = _count_and_range(
+        trips_list, 'date', approximate=not filtered)
 
-    trip_count = trips_list.count()
-    min_date = None
-    max_date = None
-
-    if trip_count > 0:
-        date_aggregation = trips_list.aggregate(
-            min_date=Min('date'), max_date=Max('date'))
-        min_date = date_aggregation['min_date']
-        max_date = date_aggregation['max_date']
-
-    trips_list = paginate_queryset(request, trips_list, items_per_page=5)
+    trips_list = paginate_queryset(
+        request, trips_list, ('date', 'departure_time', 'pk'),
+        items_per_page=5)
 
     context = {
         'page_title': 'Trips List',
@@ -162,6 +175,9 @@ def trips_list(request):
         'trip_count': trip_count,
         'min_date': min_date,
         'max_date': max_date,
+        'export_urls': _export_urls(request, 'staff_app:export_manifests'),
+        'schedule_horizon_days': settings.TRIP_SCHEDULE_HORIZON_DAYS,
+        'max_schedule_horizon_days': settings.TRIP_SCHEDULE_MAX_HORIZON_DAYS,
     }
     return render(request, 'staff_app/trips_list.html', context)
 
@@ -259,55 +275,26 @@ def bookings_list(request):
     filter_customer_name = request.GET.get('customer_name')
     filter_status = request.GET.get('status')
     filter_trip_date = request.GET.get('trip_date')
-    filter_refund_status = request.GET.get('refund_status')
-
-    # Apply filters
-    if filter_trip_number:
-        bookings_list = bookings_list.filter(
-            trip__trip_number__icontains=filter_trip_number)
-
-    if filter_customer_name:
-        bookings_list = bookings_list.filter(
-            passengers__name__icontains=filter_customer_name).distinct()
-
-    if filter_status:
-        bookings_list = bookings_list.filter(status__iexact=filter_status)
-
-    if filter_refund_status:
-        bookings_list = bookings_list.filter(
-            refund_status=filter_refund_status)
 
     if filter_trip_date:
         try:
-            date_obj = datetime.strptime(filter_trip_date, '%Y-%m-%d').date()
-            bookings_list = bookings_list.filter(trip__date=date_obj)
+            datetime.strptime(filter_trip_date, '%Y-%m-%d')
         except ValueError:
             messages.error(
                 request,
                 f"Invalid date format for 'Trip Date'."
                 f"Please use YYYY-MM-DD. Filter was not applied.")
-        except Exception as e:
-            messages.error(
-                request,
-                f"An unexpected error occurred with the"
-                f"'Trip Date' filter: {e}")
 
-    # --- Calculate Booking Count and Date Range ---
-    bookings_list = bookings_list.order_by('-booking_date')
+    bookings_list, filtered = filter_bookings(bookings_list, request.GET)
 
-    booking_count = bookings_list.count()
-    min_booking_date = None
-    max_booking_date = None
-
-    if booking_count > 0:
-        date_aggregation = bookings_list.aggregate(
-            min_date=Min('booking_date'), max_date=Max('booking_date'))
-        min_booking_date = date_aggregation['min_date']
-        max_booking_date = date_aggregation['max_date']
+    # --- Calculate Booking Count and Date Range ---
+    booking_count, min_booking_date, max_booking_date = _count_and_range(
+        bookings_list, 'booking_date', approximate=not filtered)
 
     abandoned_bookings = get_all_abandoned_bookings()
 
-    bookings_list = paginate_queryset(request, bookings_list, items_per_page=5)
+    bookings_list = paginate_queryset(
+        request, bookings_list, ('-booking_date', '-pk'), items_per_page=5)
 
     context = {
         'page_title': 'Bookings List',
@@ -326,25 +313,86 @@ def bookings_list(request):
         'max_booking_date': max_booking_date,
         'unpaid_bookings_count': abandoned_bookings['unpaid_count'],
         'departed_bookings_count': abandoned_bookings['departed_count'],
-        'null_bookings_count': abandoned_bookings['null_count']
+        'null_bookings_count': abandoned_bookings['null_count'],
+        'export_urls': _export_urls(request, 'staff_app:export_bookings'),
     }
     return render(request, 'staff_app/bookings_list.html', context)
 
 
+# --- Export Views ---
+def _export_response(lines, export_format, name):
+    """
+    Returns a StreamingHttpResponse that downloads the given lines.
+    """
+    response = StreamingHttpResponse(
+        lines, content_type=EXPORT_FORMATS[export_format])
+    filename = f"{name}-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _export_format(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export format.")
+    return export_format
+
+
+@login_required
+@user_passes_test(is_staff_user, login_url='/accounts/login/')
+def export_bookings(request):
+    """
+    Streams the bookings matching the bookings list filters, with their
+    trip and passengers, as CSV or JSONL (?format=).
+    """
+    export_format = _export_format(request)
+    try:
+        bookings, _ = filter_bookings(
+            Booking.objects.all(), request.GET, strict=True)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e), content_type='text/plain')
+    return _export_response(
+        stream_bookings(bookings, export_format), export_format, 'bookings')
+
+
+@login_required
+@user_passes_test(is_staff_user, login_url='/accounts/login/')
+def export_manifests(request):
+    """
+    Streams the passenger manifests of the trips matching the trips list
+    filters as CSV or JSONL (?format=).
+    """
+    export_format = _export_format(request)
+    try:
+        trips, _ = filter_trips(Trip.objects.all(), request.GET, strict=True)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e), content_type='text/plain')
+    return _export_response(
+        stream_manifests(trips, export_format), export_format, 'manifests')
+
+
 # --- Generate Trips View ---
 @login_required
+@user_passes_test(is_staff_user, login_url='/accounts/login/')
 @require_POST
 def generate_trips_view(request):
     """
-    View to programmatically run the generate_trips management command.
+    View to programmatically run the generate_trips management command
+    over the horizon (in days) posted with the form.
     """
+    try:
+        days = int(request.POST.get('days', ''))
+    except ValueError:
+        days = settings.TRIP_SCHEDULE_HORIZON_DAYS
+    days = min(max(days, 1), settings.TRIP_SCHEDULE_MAX_HORIZON_DAYS)
+
     out = StringIO()
     err = StringIO()
     try:
         command = GenerateTripsCommand()
         command.stdout = out
         command.stderr = err
-        command.handle()
+        command.handle(days=days)
 
         error_output = err.getvalue().strip()
         if error_output:
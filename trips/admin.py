@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Trip
+from .models import (
+    Trip, Station, Route, RouteAvailability, ScheduleTemplate,
+    ScheduleDeparture,
+)
 from django.db.models import Sum
 
 
@@ -27,9 +30,63 @@ class TripAdmin(admin.ModelAdmin):
         'destination_station',
     )
 
-    list_filter = ('origin', 'destination', 'date')
+    list_filter = ('route', 'date')
     search_fields = ('trip_number', 'origin', 'destination', 'bus_number')
     ordering = ('-date', '-departure_time')
 
 
+class StationAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the Station model.
+    """
+    list_display = ('name', 'normalized_name')
+    search_fields = ('name',)
+
+
+class RouteAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the Route model.
+    """
+    list_display = ('origin', 'destination')
+    list_select_related = ('origin', 'destination')
+
+
+class RouteAvailabilityAdmin(admin.ModelAdmin):
+    """
+    Read-mostly view of the route availability calendar.
+    """
+    list_display = ('route', 'date', 'max_available_seats')
+    list_filter = ('route',)
+    ordering = ('route', 'date')
+
+
+class ScheduleDepartureInline(admin.TabularInline):
+    model = ScheduleDeparture
+    extra = 1
+
+
+class ScheduleTemplateAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the schedule templates trips are generated from.
+    """
+    list_display = (
+        'trip_number_prefix',
+        'route',
+        'days_of_week',
+        'duration',
+        'capacity',
+        'price',
+        'valid_from',
+        'valid_until',
+        'is_active',
+    )
+    list_filter = ('is_active', 'route')
+    list_select_related = ('route__origin', 'route__destination')
+    inlines = [ScheduleDepartureInline]
+
+
 admin.site.register(Trip, TripAdmin)
+admin.site.register(Station, StationAdmin)
+admin.site.register(Route, RouteAdmin)
+admin.site.register(RouteAvailability, RouteAvailabilityAdmin)
+admin.site.register(ScheduleTemplate, ScheduleTemplateAdmin)
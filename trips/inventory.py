@@ -0,0 +1,54 @@
+"""
+Seat inventory for trips.
+
+Every change to Trip.available_seats goes through this module. Seats are
+taken with a single conditional UPDATE, so two checkouts racing for the
+last seats can never both succeed.
+"""
+from django.db.models import F
+
+from .models import Trip, availability_changed
+
+
+class SeatsUnavailable(Exception):
+    """
+    Raised when a trip does not have enough seats left for a reservation.
+    """
+
+
+def reserve_seats(trip, number_of_seats):
+    """
+    Takes seats from the trip if, and only if, enough are left.
+
+    Runs `UPDATE ... SET available_seats = available_seats - n
+    WHERE available_seats >= n` and returns True when the row was
+    updated, False otherwise.
+    """
+    if number_of_seats <= 0:
+        return True
+    return trip.adjust_counters(available_seats=-number_of_seats)
+
+
+def release_seats(trip, number_of_seats):
+    """
+    Returns seats to the trip.
+    """
+    if number_of_seats <= 0:
+        return
+    trip.adjust_counters(available_seats=number_of_seats)
+
+
+def release_seats_by_trip(seats_by_trip_id):
+    """
+    Returns seats to many trips at once, with one F() increment per trip.
+    seats_by_trip_id maps trip ids to the number of seats to give back.
+    """
+    trip_ids = [
+        trip_id for trip_id, seats in seats_by_trip_id.items() if seats > 0]
+    for trip_id in trip_ids:
+        Trip.objects.filter(pk=trip_id).update(
+            available_seats=F('available_seats') + seats_by_trip_id[trip_id])
+
+    for route_id, date in Trip.objects.filter(
+            pk__in=trip_ids).values_list('route_id', 'date').distinct():
+        availability_changed(route_id, date)
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_trip_routes(apps, schema_editor):
+    """
+    Creates a station for every distinct origin/destination name and a
+    route for every distinct pair, then points existing trips at them with
+    one UPDATE per pair.
+    """
+    Trip = apps.get_model('trips', 'Trip')
+    Station = apps.get_model('trips', 'Station')
+    Route = apps.get_model('trips', 'Route')
+
+    def get_station(name):
+        name = ' '.join(name.split())
+        station, created = Station.objects.get_or_create(
+            normalized_name=name.casefold(), defaults={'name': name})
+        return station
+
+    pairs = Trip.objects.values_list(
+        'origin', 'destination').distinct().order_by()
+    for origin, destination in pairs:
+        route, created = Route.objects.get_or_create(
+            origin=get_station(origin),
+            destination=get_station(destination))
+        Trip.objects.filter(
+            origin=origin, destination=destination).update(route=route)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_remove_trip_temp_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Station',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True)),
+                ('normalized_name', models.CharField(editable=False, max_length=30, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route',
+            field=models.ForeignKey(blank=True, help_text='Set from origin and destination when the trip is saved.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='trips', to='trips.route'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['route', 'date'], name='trip_route_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='destination',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='arriving_routes', to='trips.station'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='origin',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='departing_routes', to='trips.station'),
+        ),
+        migrations.AddConstraint(
+            model_name='route',
+            constraint=models.UniqueConstraint(fields=('origin', 'destination'), name='unique_route_origin_destination'),
+        ),
+        migrations.RunPython(
+            backfill_trip_routes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:38
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_schedule_timestamps(apps, schema_editor):
+    """
+    Fills departure_at/arrival_at for existing trips in batches.
+    """
+    Trip = apps.get_model('trips', 'Trip')
+    trips = Trip.objects.only(
+        'trip_id', 'date', 'departure_time', 'arrival_time'
+    ).order_by('trip_id')
+    last_trip_id = 0
+    while True:
+        batch = list(trips.filter(trip_id__gt=last_trip_id)[:2000])
+        if not batch:
+            break
+        for trip in batch:
+            trip.departure_at = timezone.make_aware(
+                datetime.combine(trip.date, trip.departure_time))
+            arrival = datetime.combine(trip.date, trip.arrival_time)
+            if trip.arrival_time < trip.departure_time:
+                arrival += timedelta(days=1)
+            trip.arrival_at = timezone.make_aware(arrival)
+        Trip.objects.bulk_update(batch, ['departure_at', 'arrival_at'])
+        last_trip_id = batch[-1].trip_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_station_route_trip_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='arrival_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Timezone-aware arrival, on the next day when arrival_time is earlier than departure_time.', null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='departure_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Timezone-aware departure, kept in sync with date and departure_time.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['route', 'departure_at'], name='trip_route_departure_idx'),
+        ),
+        migrations.RunPython(
+            backfill_schedule_timestamps, migrations.RunPython.noop),
+    ]
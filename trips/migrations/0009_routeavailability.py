@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def build_route_availability(apps, schema_editor):
+    """
+    Builds the availability calendar from existing trips with a single
+    grouped query.
+    """
+    Trip = apps.get_model('trips', 'Trip')
+    RouteAvailability = apps.get_model('trips', 'RouteAvailability')
+    rows = Trip.objects.filter(route__isnull=False).values(
+        'route_id', 'date'
+    ).annotate(max_seats=Max('available_seats')).order_by()
+    RouteAvailability.objects.bulk_create(
+        [
+            RouteAvailability(
+                route_id=row['route_id'],
+                date=row['date'],
+                max_available_seats=row['max_seats'])
+            for row in rows.iterator()
+        ],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_trip_departure_at_arrival_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('max_available_seats', models.IntegerField(default=0)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='trips.route')),
+            ],
+            options={
+                'verbose_name_plural': 'Route availability',
+                'constraints': [models.UniqueConstraint(fields=('route', 'date'), name='unique_route_availability_date')],
+            },
+        ),
+        migrations.RunPython(
+            build_route_availability, migrations.RunPython.noop),
+    ]
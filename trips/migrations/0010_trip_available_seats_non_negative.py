@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:41
+
+from django.db import migrations, models
+
+
+def clamp_negative_seats(apps, schema_editor):
+    """
+    Earlier read-modify-write seat updates could oversell a trip; clamp
+    those rows so the new constraint can be added.
+    """
+    Trip = apps.get_model('trips', 'Trip')
+    Trip.objects.filter(available_seats__lt=0).update(available_seats=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_routeavailability'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_negative_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.CheckConstraint(condition=models.Q(('available_seats__gte', 0)), name='trip_available_seats_non_negative'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+import datetime
+import decimal
+
+
+def normalize_station_name(name):
+    # A copy of trips.models.normalize_station_name as of this migration.
+    return ' '.join((name or '').split()).casefold()
+
+
+def create_default_schedules(apps, schema_editor):
+    """
+    Turns the two routes generate_trips used to hard-code into schedule
+    templates: departures every two hours from 06:00 to 14:00, three
+    hours long, 12 seats at Php 250, every day.
+    """
+    Station = apps.get_model('trips', 'Station')
+    Route = apps.get_model('trips', 'Route')
+    ScheduleTemplate = apps.get_model('trips', 'ScheduleTemplate')
+    ScheduleDeparture = apps.get_model('trips', 'ScheduleDeparture')
+
+    stations = {}
+    for name in ('Kabayan, Benguet', 'Baguio City'):
+        stations[name], _ = Station.objects.get_or_create(
+            normalized_name=normalize_station_name(name),
+            defaults={'name': name})
+
+    for prefix, origin, destination in (
+            ('KAB-BAG', 'Kabayan, Benguet', 'Baguio City'),
+            ('BAG-KAB', 'Baguio City', 'Kabayan, Benguet')):
+        route, _ = Route.objects.get_or_create(
+            origin=stations[origin], destination=stations[destination])
+        template = ScheduleTemplate.objects.create(
+            route=route,
+            trip_number_prefix=prefix,
+            duration=datetime.timedelta(hours=3),
+            capacity=12,
+            price=decimal.Decimal('250.00'))
+        ScheduleDeparture.objects.bulk_create([
+            ScheduleDeparture(
+                template=template, departure_time=datetime.time(hour))
+            for hour in range(6, 16, 2)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_trip_available_seats_non_negative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trip_number_prefix', models.CharField(help_text="Trip numbers are '<prefix>-YYYYMMDD-HHMM'.", max_length=16)),
+                ('duration', models.DurationField(help_text='Travel time, e.g. 03:00:00.')),
+                ('capacity', models.PositiveIntegerField(help_text='Seats on each generated trip.')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('days_of_week', models.CharField(default='0123456', help_text='Days the schedule runs, as weekday numbers from 0 (Monday) to 6 (Sunday), e.g. 01234 for weekdays.', max_length=7, validators=[django.core.validators.RegexValidator('^[0-6]{1,7}$', 'Use weekday numbers 0 (Monday) to 6.')])),
+                ('company_name', models.CharField(default='BKODA Transport', max_length=100)),
+                ('valid_from', models.DateField(blank=True, null=True)),
+                ('valid_until', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='schedule_templates', to='trips.route')),
+            ],
+            options={
+                'ordering': ['route', 'trip_number_prefix'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleDeparture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_time', models.TimeField(help_text='Departure time (HH:MM)')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='trips.scheduletemplate')),
+            ],
+            options={
+                'ordering': ['departure_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='schedule',
+            field=models.ForeignKey(blank=True, editable=False, help_text='The schedule template this trip was generated from.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trips', to='trips.scheduletemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.UniqueConstraint(condition=models.Q(('schedule__isnull', False)), fields=('route', 'date', 'departure_time'), name='unique_scheduled_trip_departure'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledeparture',
+            constraint=models.UniqueConstraint(fields=('template', 'departure_time'), name='unique_schedule_departure_time'),
+        ),
+        migrations.RunPython(
+            create_default_schedules, migrations.RunPython.noop),
+    ]
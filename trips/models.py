@@ -1,7 +1,88 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max
 from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
+from django.utils import timezone
 from datetime import datetime, timedelta
 
+from .search_cache import bump_search_version
+
+SCHEDULE_FIELDS = {'date', 'departure_time', 'arrival_time'}
+
+# Counter columns updated in place by Trip.adjust_counters().
+COUNTER_FIELDS = {'available_seats'}
+
+
+def normalize_station_name(name):
+    """
+    Returns the canonical lookup form of a station name: surrounding and
+    repeated whitespace collapsed and case folded.
+    """
+    return ' '.join((name or '').split()).casefold()
+
+
+class Station(models.Model):
+    """
+    Represents a place that trips depart from or arrive at.
+    """
+    name = models.CharField(max_length=30, unique=True)
+    normalized_name = models.CharField(
+        max_length=30, unique=True, editable=False)
+
+    class Meta:
+        ordering = ['name']
+
+    def save(self, *args, **kwargs):
+        """
+        Keeps the normalized lookup name in step with the display name.
+        """
+        self.normalized_name = normalize_station_name(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+class Route(models.Model):
+    """
+    Represents a directed origin to destination pair that trips run on.
+    """
+    origin = models.ForeignKey(
+        Station,
+        on_delete=models.PROTECT,
+        related_name='departing_routes')
+    destination = models.ForeignKey(
+        Station,
+        on_delete=models.PROTECT,
+        related_name='arriving_routes')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['origin', 'destination'],
+                name='unique_route_origin_destination'),
+        ]
+
+    @classmethod
+    def get_for_names(cls, origin_name, destination_name):
+        """
+        Returns the route between the named stations, creating the
+        stations and the route if they do not exist yet.
+        """
+        stations = []
+        for name in (origin_name, destination_name):
+            name = ' '.join(name.split())
+            station, created = Station.objects.get_or_create(
+                normalized_name=normalize_station_name(name),
+                defaults={'name': name})
+            stations.append(station)
+        route, created = cls.objects.get_or_create(
+            origin=stations[0], destination=stations[1])
+        return route
+
+    def __str__(self):
+        return f"{self.origin} to {self.destination}"
+
 
 class Trip(models.Model):
     """
@@ -32,6 +113,82 @@ class Trip(models.Model):
     origin_station = models.CharField(max_length=255, blank=True, null=True)
     destination_station = models.CharField(
         max_length=255, blank=True, null=True)
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.PROTECT,
+        related_name='trips',
+        null=True,
+        blank=True,
+        help_text="Set from origin and destination when the trip is saved."
+    )
+    departure_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="Timezone-aware departure, kept in sync with date and "
+                  "departure_time."
+    )
+    arrival_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Timezone-aware arrival, on the next day when "
+                  "arrival_time is earlier than departure_time."
+    )
+    schedule = models.ForeignKey(
+        'ScheduleTemplate',
+        on_delete=models.SET_NULL,
+        related_name='trips',
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="The schedule template this trip was generated from."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['route', 'date'], name='trip_route_date_idx'),
+            models.Index(
+                fields=['route', 'departure_at'],
+                name='trip_route_departure_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(available_seats__gte=0),
+                name='trip_available_seats_non_negative'),
+            # Makes schedule generation idempotent. Trips added by hand
+            # are left out, so existing duplicates need no clean-up.
+            models.UniqueConstraint(
+                fields=['route', 'date', 'departure_time'],
+                condition=models.Q(schedule__isnull=False),
+                name='unique_scheduled_trip_departure'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Keeps the values loaded from the database so save() can tell which
+        fields changed without another query.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _route_needs_sync(self, update_fields=None):
+        """
+        Returns True when the route no longer matches origin/destination.
+        """
+        if update_fields is not None and \
+                not {'origin', 'destination'} & set(update_fields):
+            return False
+        if self.route_id is None:
+            return True
+        loaded = getattr(self, '_loaded_values', {})
+        return (
+            loaded.get('origin') != self.origin or
+            loaded.get('destination') != self.destination
+        )
 
     def clean(self):
         """
@@ -51,25 +208,139 @@ class Trip(models.Model):
 
         super().clean()
 
+    def sync_schedule_fields(self):
+        """
+        Sets departure_at and arrival_at from date, departure_time and
+        arrival_time. save() calls this; bulk writes that bypass save()
+        must call it on each instance before writing.
+        """
+        if not self.date or not self.departure_time:
+            self.departure_at = None
+            self.arrival_at = None
+            return
+
+        self.departure_at = timezone.make_aware(
+            datetime.combine(self.date, self.departure_time))
+        self.arrival_at = None
+        if self.arrival_time:
+            arrival = datetime.combine(self.date, self.arrival_time)
+            if self.arrival_time < self.departure_time:
+                arrival += timedelta(days=1)
+            self.arrival_at = timezone.make_aware(arrival)
+
     def save(self, *args, **kwargs):
         """
         Overrides save to explicitly call full_clean() to ensure
         the model's clean() method (which validates the price) runs
-        before the data is saved to the database.
+        before the data is saved to the database, to point the trip
+        at the route matching its origin and destination, and to keep
+        the departure_at/arrival_at timestamps in sync. Saves limited to
+        counter fields skip full_clean(); the database constraint still
+        keeps available_seats from going negative.
         """
-        self.full_clean()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or \
+                not set(update_fields) <= COUNTER_FIELDS:
+            self.full_clean()
+        if update_fields is None or SCHEDULE_FIELDS & set(update_fields):
+            self.sync_schedule_fields()
+            if update_fields is not None:
+                update_fields = set(update_fields) | {
+                    'departure_at', 'arrival_at'}
+                kwargs['update_fields'] = update_fields
+        if self.origin and self.destination and \
+                self._route_needs_sync(update_fields):
+            self.route = Route.get_for_names(self.origin, self.destination)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'route'}
+        availability_keys = self._availability_keys()
         super().save(*args, **kwargs)
+        for route_id, date in availability_keys:
+            availability_changed(route_id, date)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
+    def _availability_keys(self):
+        """
+        Returns the (route_id, date) pairs whose availability or cached
+        search results may be stale after a save: always the current one,
+        as search results show the price, times and company as well as
+        the seats, and the previous one when the trip moved to another
+        route or date.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        current = (self.route_id, self.date)
+        if loaded is None:
+            return {current}
+        return {(loaded.get('route_id'), loaded.get('date')), current}
+
+    def adjust_counters(self, **deltas):
+        """
+        Adds the given deltas to counter fields, e.g.
+        adjust_counters(available_seats=-2), with a single
+        `UPDATE ... SET field = field + delta` that skips full_clean() and
+        leaves the rest of the row alone.
+
+        A negative delta only applies while the counter stays at or above
+        zero. Returns False, changing nothing, when it would not.
+        """
+        unknown = set(deltas) - COUNTER_FIELDS
+        if unknown:
+            raise ValueError(
+                f"Not counter fields: {', '.join(sorted(unknown))}")
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return True
+
+        guards = {
+            f'{field}__gte': -delta
+            for field, delta in deltas.items() if delta < 0
+        }
+        updated = Trip.objects.filter(pk=self.pk, **guards).update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+        if not updated:
+            return False
+
+        # Mirror the change so a later save() does not write a stale count.
+        loaded = getattr(self, '_loaded_values', None)
+        for field, delta in deltas.items():
+            if getattr(self, field) is not None:
+                setattr(self, field, getattr(self, field) + delta)
+            if loaded and loaded.get(field) is not None:
+                loaded[field] += delta
+        if 'available_seats' in deltas:
+            availability_changed(self.route_id, self.date)
+        return True
 
     def update_available_seats(
             self, number_of_passengers, operation='subtract'):
         """
-        Updates the available seats for the trip.
+        Updates the available seats for the trip through the seat
+        inventory. Raises SeatsUnavailable when subtracting more seats
+        than are left.
         """
+        from .inventory import reserve_seats, release_seats, SeatsUnavailable
+
         if operation == 'subtract':
-            self.available_seats -= number_of_passengers
+            if not reserve_seats(self, number_of_passengers):
+                raise SeatsUnavailable(
+                    f"Only {self.available_seats} seats are left on "
+                    f"trip {self.trip_number}.")
         elif operation == 'add':
-            self.available_seats += number_of_passengers
-        self.save()
+            release_seats(self, number_of_passengers)
+
+    def delete(self, *args, **kwargs):
+        """
+        Overrides delete to refresh the availability calendar for the
+        trip's route and date.
+        """
+        route_id, date = self.route_id, self.date
+        result = super().delete(*args, **kwargs)
+        availability_changed(route_id, date)
+        return result
 
     @property
     def duration(self):
@@ -103,3 +374,206 @@ class Trip(models.Model):
             f"on {self.date} from {self.departure_time} to "
             f"{self.arrival_time} - Price: {self.price}"
         )
+
+
+class RouteAvailability(models.Model):
+    """
+    Availability calendar: per route and date, the most seats available on
+    any single trip. Search reads the calendar from here instead of
+    scanning trips.
+    """
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.CASCADE,
+        related_name='availability')
+    date = models.DateField()
+    max_available_seats = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Route availability'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['route', 'date'],
+                name='unique_route_availability_date'),
+        ]
+
+    @classmethod
+    def refresh(cls, route_id, date):
+        """
+        Recomputes the row for one route and date from its trips, removing
+        it when no trips remain.
+        """
+        max_seats = Trip.objects.filter(
+            route_id=route_id, date=date
+        ).aggregate(max_seats=Max('available_seats'))['max_seats']
+        if max_seats is None:
+            cls.objects.filter(route_id=route_id, date=date).delete()
+        else:
+            cls.objects.update_or_create(
+                route_id=route_id,
+                date=date,
+                defaults={'max_available_seats': max_seats})
+
+    @classmethod
+    def refresh_range(cls, route_ids, start, end):
+        """
+        Recomputes the rows for the given routes from start to end
+        (inclusive) with one grouped query and one bulk upsert. Used after
+        bulk writes that bypass Trip.save().
+        """
+        rows = Trip.objects.filter(
+            route_id__in=route_ids, date__range=(start, end)
+        ).values('route_id', 'date').annotate(
+            max_seats=Max('available_seats')).order_by()
+        cls.objects.bulk_create(
+            [
+                cls(route_id=row['route_id'],
+                    date=row['date'],
+                    max_available_seats=row['max_seats'])
+                for row in rows
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['route', 'date'],
+            update_fields=['max_available_seats'])
+
+    def __str__(self):
+        return (f"{self.route} on {self.date}: "
+                f"{self.max_available_seats} seats")
+
+
+class ScheduleTemplate(models.Model):
+    """
+    A recurring timetable for a route: the departures run on the given
+    days of the week, with the same duration, capacity and price. Trips
+    are materialized from templates by the generate_trips command.
+    """
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.PROTECT,
+        related_name='schedule_templates')
+    trip_number_prefix = models.CharField(
+        max_length=16,
+        help_text="Trip numbers are '<prefix>-YYYYMMDD-HHMM'."
+    )
+    duration = models.DurationField(
+        help_text="Travel time, e.g. 03:00:00."
+    )
+    capacity = models.PositiveIntegerField(
+        help_text="Seats on each generated trip."
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    days_of_week = models.CharField(
+        max_length=7,
+        default='0123456',
+        validators=[RegexValidator(
+            r'^[0-6]{1,7}$', "Use weekday numbers 0 (Monday) to 6.")],
+        help_text="Days the schedule runs, as weekday numbers from "
+                  "0 (Monday) to 6 (Sunday), e.g. 01234 for weekdays."
+    )
+    company_name = models.CharField(
+        max_length=100, default='BKODA Transport')
+    valid_from = models.DateField(null=True, blank=True)
+    valid_until = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['route', 'trip_number_prefix']
+
+    def clean(self):
+        """
+        Validation for model fields.
+        """
+        if self.price is not None and self.price < 0:
+            raise ValidationError(
+                {'price': 'The trip price cannot be a negative value.'})
+        if self.valid_from and self.valid_until and \
+                self.valid_until < self.valid_from:
+            raise ValidationError(
+                {'valid_until': 'The schedule cannot end before it starts.'})
+        super().clean()
+
+    def runs_on(self, day):
+        """
+        Returns True when the schedule has departures on the given date.
+        """
+        return (
+            str(day.weekday()) in self.days_of_week and
+            (self.valid_from is None or day >= self.valid_from) and
+            (self.valid_until is None or day <= self.valid_until)
+        )
+
+    def arrival_time_for(self, departure_time):
+        """
+        Returns the arrival time of a departure, wrapping past midnight.
+        """
+        return (datetime.combine(datetime.min.date(), departure_time) +
+                self.duration).time()
+
+    def build_trip(self, day, departure_time):
+        """
+        Returns an unsaved trip for one departure on the given date, with
+        its schedule fields already synced for bulk_create().
+        """
+        trip = Trip(
+            trip_number=(
+                f"{self.trip_number_prefix}-{day:%Y%m%d}-"
+                f"{departure_time:%H%M}"),
+            origin=self.route.origin.name,
+            destination=self.route.destination.name,
+            date=day,
+            departure_time=departure_time,
+            arrival_time=self.arrival_time_for(departure_time),
+            available_seats=self.capacity,
+            price=self.price,
+            company_name=self.company_name,
+            route=self.route,
+            schedule=self,
+        )
+        trip.sync_schedule_fields()
+        return trip
+
+    def __str__(self):
+        return f"{self.trip_number_prefix} ({self.route})"
+
+
+class ScheduleDeparture(models.Model):
+    """
+    One daily departure time of a schedule template.
+    """
+    template = models.ForeignKey(
+        ScheduleTemplate,
+        on_delete=models.CASCADE,
+        related_name='departures')
+    departure_time = models.TimeField(
+        help_text="Departure time (HH:MM)"
+    )
+
+    class Meta:
+        ordering = ['departure_time']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['template', 'departure_time'],
+                name='unique_schedule_departure_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.template.trip_number_prefix} {self.departure_time}"
+
+
+def availability_changed(route_id, date):
+    """
+    Called whenever seats on a route and date change. Once the surrounding
+    transaction commits, refreshes the availability calendar and
+    invalidates cached searches for that route and date.
+    """
+    if route_id is None or date is None:
+        return
+
+    def refresh():
+        RouteAvailability.refresh(route_id, date)
+        bump_search_version(route_id, date)
+
+    # robust: a failed refresh is logged and must never undo or mask the
+    # seat change that has already committed.
+    transaction.on_commit(refresh, robust=True)
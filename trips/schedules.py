@@ -0,0 +1,106 @@
+"""
+Trip generation from schedule templates.
+
+generate_scheduled_trips materializes every active ScheduleTemplate over a
+date range with a fixed number of queries: one read of the trips already
+in the range, bulk INSERTs for the missing departures, bulk UPDATEs for
+generated trips whose price or arrival changed, and one grouped refresh
+of the availability calendar. Departures are keyed on (route, date,
+departure_time), so rerunning over the same range creates nothing new.
+"""
+from django.db import transaction
+
+from datetime import timedelta
+
+from .models import RouteAvailability, ScheduleTemplate, Trip
+from .search_cache import bump_search_version
+
+BATCH_SIZE = 1000
+
+# Fields a rerun refreshes on trips already generated. Seats are a live
+# counter and are never overwritten.
+UPSERT_FIELDS = ['price', 'arrival_time', 'arrival_at']
+
+
+def _dates(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def _refresh_availability(route_ids, start, end, changed):
+    RouteAvailability.refresh_range(route_ids, start, end)
+    for route_id, day in changed:
+        bump_search_version(route_id, day)
+
+
+def generate_scheduled_trips(start, end, templates=None):
+    """
+    Creates the trips of the active schedule templates (or of the given
+    templates) from start to end inclusive, and updates the price and
+    arrival of trips already generated from them. Departures that
+    already have a trip on the same route, date and time, generated or
+    not, are skipped. Returns (created, updated).
+    """
+    if templates is None:
+        templates = ScheduleTemplate.objects.filter(is_active=True)
+    templates = list(templates.select_related(
+        'route__origin', 'route__destination').prefetch_related(
+        'departures'))
+    if not templates or end < start:
+        return 0, 0
+
+    route_ids = {template.route_id for template in templates}
+    existing = {
+        (route_id, day, departure_time): (pk, schedule_id, price, arrival)
+        for pk, route_id, day, departure_time, schedule_id, price, arrival
+        in Trip.objects.filter(
+            route_id__in=route_ids, date__range=(start, end)
+        ).values_list(
+            'pk', 'route_id', 'date', 'departure_time', 'schedule_id',
+            'price', 'arrival_time').iterator(chunk_size=BATCH_SIZE)
+    }
+
+    new_trips = []
+    changed_trips = []
+    for template in templates:
+        departures = [
+            (departure.departure_time,
+             template.arrival_time_for(departure.departure_time))
+            for departure in template.departures.all()]
+        for day in _dates(start, end):
+            if not template.runs_on(day):
+                continue
+            for departure_time, arrival_time in departures:
+                key = (template.route_id, day, departure_time)
+                current = existing.get(key)
+                if current is None:
+                    new_trips.append(
+                        template.build_trip(day, departure_time))
+                    existing[key] = (None, template.pk, template.price,
+                                     arrival_time)
+                elif current[0] is not None and \
+                        current[1] == template.pk and \
+                        current[2:] != (template.price, arrival_time):
+                    trip = template.build_trip(day, departure_time)
+                    trip.pk = current[0]
+                    changed_trips.append(trip)
+
+    with transaction.atomic():
+        # ignore_conflicts: a concurrent run may have inserted the same
+        # departures since they were read.
+        Trip.objects.bulk_create(
+            new_trips, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        Trip.objects.bulk_update(
+            changed_trips, UPSERT_FIELDS, batch_size=BATCH_SIZE)
+        changed = {
+            (trip.route_id, trip.date)
+            for trip in new_trips + changed_trips}
+        if changed:
+            transaction.on_commit(
+                lambda: _refresh_availability(
+                    route_ids, start, end, changed),
+                robust=True)
+
+    return len(new_trips), len(changed_trips)
@@ -0,0 +1,133 @@
+"""
+Trip search result cache.
+
+Search results and availability calendars are cached under keys that
+embed a version counter. Seat changes bump the counter for the affected
+route/date (and the route's calendar counter), so stale entries are
+never read again and simply expire. The counters only reach every web
+worker through a shared cache, so production runs on Redis (REDIS_URL);
+settings refuse to start several workers on the per-process LocMemCache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sent after every cache lookup with `kind` ('results' or 'calendar'),
+# `hit` (bool) and `duration` (seconds, including the recompute on a miss).
+search_cache_lookup = Signal()
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _cache_timeout():
+    return getattr(settings, 'TRIP_SEARCH_CACHE_TIMEOUT', 60)
+
+
+def _version_key(route_id, date=None):
+    if date is None:
+        return f"trips:search:version:{route_id}"
+    return f"trips:search:version:{route_id}:{date.isoformat()}"
+
+
+def _get_version(key):
+    """
+    Returns the current version for a key. Missing versions start from
+    the current time in milliseconds, so an evicted counter can never
+    fall back to a value that older cache entries were written under.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_search_version(route_id, date):
+    """
+    Invalidates cached results for the route and date, and the route's
+    cached calendars.
+    """
+    for key in (_version_key(route_id, date), _version_key(route_id)):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def _record(kind, hit, duration):
+    with _stats_lock:
+        entry = _stats.setdefault(
+            kind, {'hits': 0, 'misses': 0, 'total_seconds': 0.0})
+        entry['hits' if hit else 'misses'] += 1
+        entry['total_seconds'] += duration
+    logger.debug(
+        "Trip search cache %s %s in %.2fms",
+        kind, 'hit' if hit else 'miss', duration * 1000)
+    search_cache_lookup.send(
+        sender=None, kind=kind, hit=hit, duration=duration)
+
+
+def _get_or_compute(kind, key, compute):
+    started = time.perf_counter()
+    value = cache.get(key)
+    hit = value is not None
+    if not hit:
+        value = compute()
+        cache.set(key, value, _cache_timeout())
+    _record(kind, hit, time.perf_counter() - started)
+    return value
+
+
+def cached_search_results(route_id, date, num_passengers, compute):
+    """
+    Returns the cached priced trip list for the normalized query,
+    calling compute() on a miss.
+    """
+    version = _get_version(_version_key(route_id, date))
+    key = (f"trips:search:results:{route_id}:{date.isoformat()}:"
+           f"{num_passengers}:{version}")
+    return _get_or_compute('results', key, compute)
+
+
+def cached_calendar(route_id, num_passengers, today, compute):
+    """
+    Returns the cached available dates for the route and passenger count,
+    calling compute() on a miss.
+    """
+    version = _get_version(_version_key(route_id))
+    key = (f"trips:search:calendar:{route_id}:{today.isoformat()}:"
+           f"{num_passengers}:{version}")
+    return _get_or_compute('calendar', key, compute)
+
+
+def get_search_cache_stats():
+    """
+    Returns per-kind hit/miss counts, hit rate and mean lookup latency for
+    this process.
+    """
+    with _stats_lock:
+        stats = {}
+        for kind, entry in _stats.items():
+            lookups = entry['hits'] + entry['misses']
+            stats[kind] = {
+                'hits': entry['hits'],
+                'misses': entry['misses'],
+                'hit_rate': entry['hits'] / lookups if lookups else 0.0,
+                'avg_latency_ms':
+                    entry['total_seconds'] * 1000 / lookups
+                    if lookups else 0.0,
+            }
+        return stats
+
+
+def reset_search_cache_stats():
+    """Clears the counters returned by get_search_cache_stats()."""
+    with _stats_lock:
+        _stats.clear()
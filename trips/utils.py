@@ -0,0 +1,156 @@
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from .models import (Route, RouteAvailability, Station, Trip,
+                     normalize_station_name)
+from .search_cache import cached_calendar, cached_search_results
+
+
+def match_station_ids(name):
+    """
+    Turns free-text station input into a list of station ids.
+
+    An exact match on the normalized name wins. Otherwise falls back to a
+    partial match, which only ever scans the small station table and never
+    the trips table.
+    """
+    normalized_name = normalize_station_name(name)
+    if not normalized_name:
+        return []
+
+    exact_ids = list(Station.objects.filter(
+        normalized_name=normalized_name).values_list('id', flat=True))
+    if exact_ids:
+        return exact_ids
+
+    return list(Station.objects.filter(
+        normalized_name__contains=normalized_name).values_list(
+            'id', flat=True))
+
+
+def resolve_route_ids(origin, destination):
+    """
+    Resolves free-text origin and destination input to the ids of every
+    route connecting a matching origin station to a matching destination
+    station. Partial input such as 'Bag' can match several stations, so
+    more than one route may be returned; an empty list means no route.
+    """
+    origin_ids = match_station_ids(origin)
+    destination_ids = match_station_ids(destination)
+    if not origin_ids or not destination_ids:
+        return []
+
+    return list(Route.objects.filter(
+        origin_id__in=origin_ids,
+        destination_id__in=destination_ids
+    ).order_by('id').values_list('id', flat=True))
+
+
+def match_route_ids(origin=None, destination=None):
+    """
+    Returns the ids of every route matching the given (optional) origin
+    and destination input. Used by listing filters where either side may
+    be left blank.
+    """
+    routes = Route.objects.all()
+    if origin:
+        routes = routes.filter(origin_id__in=match_station_ids(origin))
+    if destination:
+        routes = routes.filter(
+            destination_id__in=match_station_ids(destination))
+    return list(routes.values_list('id', flat=True))
+
+
+def departure_window(day, now=None):
+    """
+    Returns the (start, end) departure_at bounds for trips on the given
+    day that have not left yet, for use as a single range predicate.
+    """
+    now = now or timezone.now()
+    day_start = timezone.make_aware(datetime.combine(day, time.min))
+    day_end = timezone.make_aware(
+        datetime.combine(day + timedelta(days=1), time.min))
+    return max(day_start, now), day_end
+
+
+def get_available_dates(route_ids, num_passengers, today=None):
+    """
+    Returns the sorted dates, from today on, that have at least one trip
+    on any of the routes with enough seats for num_passengers.
+
+    Reads each route's precomputed availability calendar through the
+    search cache.
+    """
+    today = today or timezone.localdate()
+    available_dates = set()
+    for route_id in route_ids:
+        available_dates.update(cached_calendar(
+            route_id, num_passengers, today,
+            lambda route_id=route_id: _get_available_dates(
+                route_id, num_passengers, today)))
+    return sorted(available_dates)
+
+
+def _get_available_dates(route_id, num_passengers, today):
+    """
+    Uncached calendar read. Today is only kept when a qualifying trip has
+    not departed yet, which the calendar cannot tell.
+    """
+    available_dates = list(RouteAvailability.objects.filter(
+        route_id=route_id,
+        date__gte=today,
+        max_available_seats__gte=num_passengers
+    ).order_by('date').values_list('date', flat=True))
+
+    if available_dates and available_dates[0] == today:
+        departs_from, departs_before = departure_window(today)
+        if not Trip.objects.filter(
+                route_id=route_id,
+                departure_at__gte=departs_from,
+                departure_at__lt=departs_before,
+                available_seats__gte=num_passengers).exists():
+            available_dates.pop(0)
+
+    return available_dates
+
+
+def search_trips(route_ids, day, num_passengers):
+    """
+    Returns the priced trips on any of the routes and the day that have
+    not departed and have enough seats, in departure order.
+
+    Results come from the search cache, per route. Entries live for at
+    most TRIP_SEARCH_CACHE_TIMEOUT seconds, so trips that left since they
+    were cached are dropped on read.
+    """
+    trip_list = []
+    for route_id in route_ids:
+        trip_list.extend(cached_search_results(
+            route_id, day, num_passengers,
+            lambda route_id=route_id: _search_trips(
+                route_id, day, num_passengers)))
+    now = timezone.now()
+    return sorted(
+        (trip for trip in trip_list if trip.departure_at >= now),
+        key=lambda trip: (trip.departure_at, trip.pk))
+
+
+def _search_trips(route_id, day, num_passengers):
+    """
+    Uncached trip search and pricing.
+    """
+    departs_from, departs_before = departure_window(day)
+    trip_list = list(Trip.objects.filter(
+        route_id=route_id,
+        departure_at__gte=departs_from,
+        departure_at__lt=departs_before,
+        available_seats__gte=num_passengers
+    ).order_by('departure_at'))
+
+    for trip in trip_list:
+        total_price = trip.price * Decimal(num_passengers)
+        trip.total_display_price = total_price.quantize(Decimal('0.01'))
+        trip.requested_passengers = num_passengers
+
+    return trip_list
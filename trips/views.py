@@ -3,10 +3,12 @@ from django.contrib import messages
 from django.urls import reverse
 from datetime import datetime, timedelta
 from django.utils import timezone
-from decimal import Decimal
 
-from .models import Trip
 from .forms import TripSearchForm
+from .utils import (resolve_route_ids,
+                    get_available_dates,
+                    search_trips
+                    )
 from booking.models import Booking
 
 
@@ -84,36 +86,17 @@ def find_trip(request):
     today_date = timezone.localdate()
     disable_previous_day = (requested_date <= today_date)
 
+    route_ids = []
+    if requested_origin and requested_destination:
+        route_ids = resolve_route_ids(
+            requested_origin, requested_destination)
+
     available_dates = []
-    if requested_origin and requested_destination and \
-            number_of_passengers_for_query:
-        now_aware = timezone.now()
-        today_trips_dates = Trip.objects.filter(
-            origin__icontains=requested_origin,
-            destination__icontains=requested_destination,
-            date=today_date,
-            available_seats__gte=number_of_passengers_for_query
-        )
-        today_available_trips = [
-            trip for trip in today_trips_dates
-            if timezone.make_aware(datetime.combine(
-                trip.date, trip.departure_time)) >= now_aware
-        ]
-        if today_available_trips:
-            available_dates.append(today_date)
-
-        future_trips_dates_queryset = Trip.objects.filter(
-            origin__icontains=requested_origin,
-            destination__icontains=requested_destination,
-            date__gt=today_date,
-            available_seats__gte=number_of_passengers_for_query
-        ).values_list('date', flat=True).distinct().order_by('date')
-
-        for d in future_trips_dates_queryset:
-            available_dates.append(d)
-
-    available_dates_str = [d.strftime('%Y-%m-%d')
-                           for d in sorted(list(set(available_dates)))]
+    if route_ids and number_of_passengers_for_query:
+        available_dates = get_available_dates(
+            route_ids, number_of_passengers_for_query, today_date)
+
+    available_dates_str = [d.strftime('%Y-%m-%d') for d in available_dates]
 
     last_available_date = None
     if available_dates:
@@ -146,8 +129,6 @@ def find_trip(request):
         context['original_booking_id'] = original_booking.id
         context['original_booking'] = original_booking
 
-    trip_list = []
-
     if form.is_valid():
         requested_origin = form.cleaned_data.get('origin')
         requested_destination = form.cleaned_data.get('destination')
@@ -158,35 +139,13 @@ def find_trip(request):
 
         if requested_date and requested_origin and requested_destination:
             try:
-                trip_list_queryset = Trip.objects.filter(
-                    origin__icontains=requested_origin,
-                    destination__icontains=requested_destination,
-                    date=requested_date,
-                    available_seats__gte=number_of_passengers_for_query
-                )
-
-                for trip in trip_list_queryset:
-                    trip_datetime_naive = datetime.combine(
-                        trip.date, trip.departure_time)
-                    trip_datetime_aware = timezone.make_aware(
-                        trip_datetime_naive)
-
-                    if trip_datetime_aware >= now_aware:
-                        calculated_total_price = trip.price * Decimal(
-                            number_of_passengers_for_query)
-                        calculated_total_price = \
-                            calculated_total_price.quantize(Decimal('0.01'))
-
-                        trip.total_display_price = calculated_total_price
-                        trip.requested_passengers = \
-                            number_of_passengers_for_query
-
-                        trip_list.append(trip)
-                    else:
-                        pass
-
-                final_trip_list = sorted(
-                    trip_list, key=lambda trip: trip.departure_time)
+                final_trip_list = []
+                if route_ids:
+                    final_trip_list = search_trips(
+                        route_ids,
+                        requested_date,
+                        number_of_passengers_for_query
+                    )
 
                 if len(final_trip_list) > 0:
                     context['trip_list'] = final_trip_list